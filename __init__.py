@@ -50,7 +50,35 @@ __contributors__ = {}
 # This is a url where the most recent plugin package can be downloaded.
 __url__ = '' # 'http://supybot.com/Members/yourname/ORE-testing/download'
 
+import sys
+
 import config
+import rngs
+reload(rngs)
+import dice
+reload(dice) # In case we're being reloaded.
+import formatting
+reload(formatting)
+import systems
+reload(systems)
+import expr
+reload(expr)
+import bulk
+reload(bulk)
+import workers
+reload(workers)
+import limits
+reload(limits)
+import stats
+reload(stats)
+import core
+reload(core)
+# These are imported the first time they're needed, so only reload the ones
+# that already have been; the rest will be loaded fresh when they're used.
+for name in ('odds', 'simulate', 'rolllog', 'macros'):
+    if '%s.%s'%(__name__, name) in sys.modules:
+        reload(sys.modules['%s.%s'%(__name__, name)])
+del name
 import plugin
 reload(plugin) # In case we're being reloaded.
 # Add more reloads here if you add third-party modules and want them to be
@@ -0,0 +1,249 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Benchmarks for every roll path in RPGDice, no IRC connection needed.
+
+Run it from the plugin's directory:
+
+    python bench.py [-n ITERATIONS] [-o FILE] [-k FILTER] [-c OLD_FILE]
+
+Each case is timed call by call, and its throughput and latency percentiles
+are written to FILE as JSON. Given an earlier FILE with -c, the change in
+throughput for every case is printed alongside. The command cases run
+core.rollSystem, as the plugin and the dice server do, so they cover a
+command's cost short of Supybot itself. The startup cases import what the
+plugin loads at startup in a fresh interpreter (against a bare one, for
+scale) and time reloading it, and the results note any slow module that a
+cold start imported when it should have waited until it was needed."""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from optparse import OptionParser
+from timeit import default_timer
+
+import core
+import dice
+import expr
+import odds
+import rngs
+import systems
+
+#what the plugin imports at startup, in the order its __init__ reloads them
+STARTUP = ('rngs', 'dice', 'formatting', 'systems', 'expr', 'bulk',
+           'workers', 'limits', 'stats', 'core')
+#slow modules that should only be imported once they're needed
+LAZY = ('numpy', 'multiprocessing', 'fractions', 'sqlite3', 'mmap', 'odds',
+        'simulate', 'rolllog', 'macros')
+#fresh interpreters started per startup case; each one is slow
+STARTUP_RUNS = 20
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+def coldStart(modules):
+    '''Returns a function that imports {modules} in a fresh interpreter.'''
+    code = 'import %s'%', '.join(modules) if modules else 'pass'
+    return lambda: subprocess.check_call([sys.executable, '-c', code],
+                                         cwd=_here)
+
+def coldImports():
+    '''Returns which of LAZY a fresh interpreter importing STARTUP ends up
+    with.'''
+    code = ('import sys, %s; print(",".join(m for m in %r if m in '
+            'sys.modules))')%(', '.join(STARTUP), LAZY)
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=_here)
+    return [name for name in output.strip().split(',') if name]
+
+def reloadAll():
+    '''Reloads STARTUP as the plugin's __init__ does.'''
+    for name in STARTUP:
+        reload(__import__(name))
+
+def percentile(ordered, fraction):
+    '''Returns the {fraction} percentile of the sorted list {ordered}.'''
+    return ordered[min(int(len(ordered) * fraction), len(ordered)-1)]
+
+def measure(func, iterations):
+    '''Calls func() {iterations} times, returning its throughput and
+    latencies.'''
+    timer = default_timer
+    latencies = []
+    append = latencies.append
+    start = timer()
+    for _ in xrange(iterations):
+        before = timer()
+        func()
+        append(timer() - before)
+    total = timer() - start
+    latencies.sort()
+    micro = lambda seconds: round(seconds * 1e6, 3)
+    return {'iterations': iterations,
+            'seconds': round(total, 6),
+            'opsPerSec': round(iterations / total, 1),
+            'latencyUs': {'p50': micro(percentile(latencies, 0.50)),
+                          'p90': micro(percentile(latencies, 0.90)),
+                          'p99': micro(percentile(latencies, 0.99)),
+                          'max': micro(latencies[-1])}}
+
+def command(name, *args):
+    '''Returns a function that runs one whole roll command for the system
+    {name}, minus sending the reply.'''
+    return lambda: core.rollSystem(name, args, None, 'nick', 'note')
+
+def cases():
+    '''Yields (name, params, function) for every benchmark. Functions bind
+    their loop variables as defaults, so they can be called at any time.'''
+    owod = systems.get('owod')
+    ore = systems.get('ore')
+    dh = systems.get('dh')
+    for pool in (1, 5, 10, 20, 100):
+        yield 'rollCounts', {'pool': pool}, \
+              lambda pool=pool: dice.rollCounts(10, pool)
+        yield 'rollDice', {'pool': pool}, \
+              lambda pool=pool: dice.expand(dice.rollCounts(10, pool))
+    for backend in sorted(rngs.BACKENDS):
+        try:
+            rng = rngs.make(backend, 'bench')
+        except (ImportError, AttributeError):
+            continue
+        yield 'rollCounts', {'pool': 10, 'rng': backend}, \
+              lambda rng=rng: dice.rollCounts(10, 10, rng)
+    for pool in (1, 5, 10):
+        counts = dice.rollCounts(10, pool)
+        yield 'matchORE', {'pool': pool}, \
+              lambda counts=counts: ore.matches(counts)
+    counts = dice.rollCounts(10, 20)
+    for diff in (3, 6, 9):
+        yield 'matchOWOD', {'pool': 20, 'diff': diff}, \
+              lambda diff=diff: owod.successes(counts, diff)
+    yield 'matchDH', {'rolls': 100}, \
+          lambda: [dh.location(roll) for roll in xrange(1, 101)]
+    for degrees in (3, 6, 12):
+        yield 'nextHit', {'degrees': degrees}, \
+              lambda degrees=degrees: dh.followUps(3, degrees)
+        yield 'volley', {'degrees': degrees, 'rolls': 100}, \
+              lambda degrees=degrees: [dh.volley(roll, degrees, 'auto')
+                       for roll in xrange(1, 101)]
+    for pool in (1, 5, 10, 20):
+        for diff in (4, 6, 8):
+            yield 'owod', {'pool': pool, 'diff': diff}, \
+                  command('owod', pool, diff)
+    for pool in (1, 5, 10):
+        yield 'ore', {'pool': pool}, command('ore', pool)
+    yield 'ore', {'pool': 10, 'called': 5, 'expert': 7}, \
+          command('ore', 10, 5, 7)
+    for test in (10, 45, 90):
+        for kind in (None, 'auto', 'semi'):
+            yield 'dh', {'test': test, 'kind': kind}, command('dh', test, kind)
+    for text in ('4d6kh3+2', '10d10>=7!', 'owod(7,6)'):
+        yield 'expr.compile', {'text': text, 'cached': False}, \
+              lambda text=text: (expr._cache.clear(),
+                              expr.compile(text))
+        yield 'expr.compile', {'text': text, 'cached': True}, \
+              lambda text=text: expr.compile(text)
+        plan = expr.compile(text)
+        yield 'expr.evaluate', {'text': text}, \
+              lambda plan=plan: expr.evaluate(plan)
+    yield 'odds.owod', {'pool': 20, 'cached': False}, \
+          lambda: (odds._owod.clear(), odds.owod(20, 6))
+    yield 'odds.owod', {'pool': 20, 'cached': True}, lambda: odds.owod(20, 6)
+    yield 'odds.ore', {'pool': 10, 'cached': False}, \
+          lambda: (odds._ore.clear(), odds.ore(10))
+    yield 'startup', {'import': 'nothing'}, coldStart(())
+    yield 'startup', {'import': 'plugin'}, coldStart(STARTUP)
+    yield 'reload', {'modules': len(STARTUP)}, reloadAll
+
+def key(result):
+    '''Returns what identifies a result between runs.'''
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--iterations', type='int', default=2000,
+                      help='calls per case (default %default)')
+    parser.add_option('-o', '--output', default='bench_results.json',
+                      help='where to write the results (default %default)')
+    parser.add_option('-k', '--filter', default='',
+                      help='only run cases whose name contains this')
+    parser.add_option('-c', '--compare', metavar='OLD_FILE',
+                      help='compare against an earlier results file')
+    options, args = parser.parse_args(argv)
+    old = {}
+    if options.compare:
+        with open(options.compare) as fd:
+            old = dict((key(r), r) for r in json.load(fd)['results'])
+    results = []
+    for name, params, func in cases():
+        if options.filter not in name:
+            continue
+        #odds tables are slow to build; don't spend all day rebuilding them
+        iterations = options.iterations
+        if params.get('cached') is False and name.startswith('odds'):
+            iterations = max(iterations // 100, 1)
+        #and starting interpreters (or reloading) is slower still
+        elif name in ('startup', 'reload'):
+            iterations = min(iterations, STARTUP_RUNS)
+        result = measure(func, iterations)
+        result['name'] = name
+        result['params'] = params
+        results.append(result)
+        line = '%-14s %-45s %12.1f/s  p50 %9.2fus  p99 %9.2fus'%(
+            name, json.dumps(params, sort_keys=True), result['opsPerSec'],
+            result['latencyUs']['p50'], result['latencyUs']['p99'])
+        if key(result) in old:
+            before = old[key(result)]['opsPerSec']
+            change = (result['opsPerSec'] - before) / before * 100
+            line += '  %+6.1f%%'%change
+        print(line)
+    cold = coldImports()
+    if cold:
+        print('a cold start imported %s'%', '.join(cold))
+    report = {'meta': {'python': sys.version.split()[0],
+                       'platform': platform.platform(),
+                       'numpy': dice.getNumpy() is not None,
+                       'coldImports': cold,
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'iterations': options.iterations},
+              'results': results}
+    with open(options.output, 'w') as fd:
+        json.dump(report, fd, indent=1, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
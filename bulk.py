@@ -0,0 +1,115 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Helpers for rolling one expression many times in a single command.
+
+Everything here is a generator, so a batch of rolls flows from the
+evaluator through the tally and into IRC-sized lines without being held in
+memory more than once."""
+
+import expr
+
+def rolls(plan, count, rng=None):
+    '''Yields (total, terms) for {count} evaluations of {plan}.'''
+    evaluate = expr.evaluate
+    for _ in xrange(count):
+        yield evaluate(plan, rng)
+
+class Tally(object):
+    """Keeps a running summary of the rolls passing through watch()."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.lowest = None
+        self.highest = None
+        #{label: rolls seen} for rolls that have a verdict, like "botched"
+        self.outcomes = {}
+
+    def add(self, total, label=None):
+        '''Counts one roll with the result {total}.'''
+        self.count += 1
+        self.total += total
+        if self.lowest is None or total < self.lowest:
+            self.lowest = total
+        if self.highest is None or total > self.highest:
+            self.highest = total
+        if label:
+            self.outcomes[label] = self.outcomes.get(label, 0) + 1
+
+    def watch(self, results, label=None):
+        '''Passes {results} straight through, counting each one on the way.
+        {label}(terms) gives a roll's verdict, if it has one.'''
+        for total, terms in results:
+            self.add(total, label and label(terms))
+            yield total, terms
+
+    def average(self):
+        if self.count:
+            return float(self.total) / self.count
+
+def split(piece, width):
+    '''Yields {piece} in parts of at most {width} characters, broken at a
+    space where there is one.'''
+    while len(piece) > width:
+        cut = piece.rfind(' ', 1, width+1)
+        if cut <= 0:
+            cut = width
+        yield piece[:cut].rstrip(' ')
+        piece = piece[cut:].lstrip(' ')
+    if piece.strip(' '):
+        yield piece.rstrip(' ')
+
+def chunks(pieces, width, sep=', '):
+    '''Packs the strings {pieces} into lines of at most {width} characters.
+    A piece longer than {width} is split over lines of its own.'''
+    line = []
+    size = 0
+    for piece in pieces:
+        if len(piece) > width:
+            if line:
+                yield sep.join(line)
+                line = []
+                size = 0
+            for part in split(piece, width):
+                yield part
+            continue
+        if line and size + len(sep) + len(piece) > width:
+            yield sep.join(line)
+            line = []
+            size = 0
+        size += len(piece) + (len(sep) if line else 0)
+        line.append(piece)
+    if line:
+        yield sep.join(line)
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
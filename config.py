@@ -40,10 +40,88 @@ def configure(advanced):
     conf.registerPlugin('RPGDice', True)
 
 
+class RngBackend(registry.OnlySomeStrings):
+    """Valid values are 'random', 'urandom', 'pcg' and 'numpy'."""
+    validStrings = ('random', 'urandom', 'pcg', 'numpy')
+
+class ReplyStyle(registry.OnlySomeStrings):
+    """Valid values are 'verbose' and 'compact'."""
+    validStrings = ('verbose', 'compact')
+
 RPGDice = conf.registerPlugin('RPGDice')
 # This is where your configuration variables (if any) should go.  For example:
 # conf.registerGlobalValue(RPGDice, 'someConfigVariableName',
 #     registry.Boolean(False, """Help for someConfigVariableName."""))
+conf.registerChannelValue(RPGDice, 'rngBackend',
+    RngBackend('random', """Determines which random number generator rolls
+    the dice in the channel: random (Python's own), urandom (the operating
+    system's, read in blocks), pcg (small and seedable) or numpy (numpy's
+    RandomState: seedable, rolls whole pools at once; needs numpy)."""))
+conf.registerChannelValue(RPGDice, 'rngSeed',
+    registry.String('', """Determines the seed the channel's random number
+    generator starts from, so its rolls can be replayed. Leave it empty to
+    seed unpredictably. urandom can't be seeded."""))
+conf.registerChannelValue(RPGDice, 'replyStyle',
+    ReplyStyle('verbose', """Determines how the owod, ore and dh commands
+    word their replies in the channel: verbose (full sentences) or compact
+    (just the dice and the outcome)."""))
+conf.registerChannelValue(RPGDice, 'replyLocale',
+    registry.String('en', """Determines which language the channel's dice
+    replies are in. Anything the language doesn't cover is in English."""))
+conf.registerChannelValue(RPGDice, 'rollLog',
+    registry.Boolean(True, """Determines whether the channel's owod, ore and
+    dh rolls are kept in the roll log, for rollhistory and rollstats."""))
+conf.registerGlobalValue(RPGDice, 'maxRollHistory',
+    registry.PositiveInteger(20, """Determines the most rolls rollhistory
+    will show at once."""))
+conf.registerGlobalValue(RPGDice, 'maxMacros',
+    registry.PositiveInteger(20, """Determines how many rolls each nick can
+    save with the save command."""))
+conf.registerGlobalValue(RPGDice, 'stats',
+    registry.Boolean(False, """Determines whether the bot times each stage
+    of its dice commands for the dicestats command."""))
+conf.registerGlobalValue(RPGDice, 'maxSimulationTrials',
+    registry.PositiveInteger(1000000, """Determines the most rolls the
+    simulate command will make in one go."""))
+conf.registerGlobalValue(RPGDice, 'maxBulkRolls',
+    registry.PositiveInteger(100, """Determines the most rolls the rolls
+    command will make in one go."""))
+conf.registerGlobalValue(RPGDice, 'bulkLineLength',
+    registry.PositiveInteger(350, """Determines how long each line of the
+    rolls command's detailed output may be."""))
+conf.registerGlobalValue(RPGDice, 'maxBulkLines',
+    registry.PositiveInteger(5, """Determines how many lines of detail the
+    rolls command will send for one batch; the summary always covers every
+    roll."""))
+conf.registerGlobalValue(RPGDice, 'bulkDelay',
+    registry.PositiveFloat(1.0, """Determines how many seconds apart the
+    lines of the rolls command's detailed output are sent."""))
+conf.registerGlobalValue(RPGDice, 'nickRollsPerMinute',
+    registry.NonNegativeInteger(30, """Determines how many dice commands a
+    nick can make a minute, on average. 0 means no limit."""))
+conf.registerGlobalValue(RPGDice, 'nickRollBurst',
+    registry.PositiveInteger(5, """Determines how many dice commands a nick
+    can make in a quick burst before nickRollsPerMinute applies."""))
+conf.registerChannelValue(RPGDice, 'channelRollsPerMinute',
+    registry.NonNegativeInteger(60, """Determines how many dice commands can
+    be made in the channel a minute, on average, so a busy channel can't
+    crowd out the bot's replies to others. 0 means no limit."""))
+conf.registerChannelValue(RPGDice, 'channelRollBurst',
+    registry.PositiveInteger(10, """Determines how many dice commands can
+    be made in the channel in a quick burst before channelRollsPerMinute
+    applies."""))
+conf.registerGlobalValue(RPGDice, 'workerThreads',
+    registry.PositiveInteger(2, """Determines how many threads run heavy
+    commands (odds, simulations, bulk rolls) off the bot's main thread.
+    Takes effect when the plugin is reloaded."""))
+conf.registerGlobalValue(RPGDice, 'workerQueueSize',
+    registry.PositiveInteger(8, """Determines how many heavy commands can be
+    waiting for a worker thread before new ones are turned away. Takes
+    effect when the plugin is reloaded."""))
+conf.registerGlobalValue(RPGDice, 'workerTimeout',
+    registry.PositiveInteger(30, """Determines how many seconds a heavy
+    command may take, counting time spent waiting for a worker, before the
+    bot gives up on it."""))
 
 
 # vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
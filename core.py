@@ -0,0 +1,290 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""RPGDice's dice engine, with no IRC in it.
+
+Everything a dice command does short of talking to IRC lives here, taking
+plain arguments and returning the reply text, so the Supybot plugin, the
+standalone server and anything else that imports this module share one
+copy of the rules. Bad input raises ValueError with a message fit to show
+the user.
+
+odds and simulate are only imported by the reports that need them, so
+loading (and reloading) the plugin doesn't pay for fractions or a
+multiprocessing pool nobody has asked for yet."""
+
+import sys
+from itertools import islice
+from collections import namedtuple
+
+import bulk
+import expr
+import formatting
+import stats
+import systems
+
+#what a system roll comes to, all the way to its reply
+Rolled = namedtuple('Rolled', 'system params raw result reply action')
+
+_notTimed = stats.timer(None, False)
+
+def loaded(name):
+    '''Returns our module {name} if something has imported it, else
+    None.'''
+    if systems.package:
+        name = '%s.%s'%(systems.package, name)
+    return sys.modules.get(name)
+
+def shutdown():
+    '''Stops the worker pools of any simulations still running.'''
+    simulate = loaded('simulate')
+    if simulate is not None:
+        simulate.shutdown()
+
+def pct(prob):
+    '''Returns the probability {prob} as a percentage string.'''
+    return "%.2f%%"%(float(prob)*100)
+
+## System rolls
+def check(name, args):
+    '''Runs the system {name}'s check on {args}, returning its params.'''
+    return systems.get(name).check(*args)
+
+def rollChecked(name, params, rng=None, nick=None, note=None, style=None,
+                timer=_notTimed):
+    '''Rolls {params} that the system {name}'s check has already passed,
+    returning a Rolled. {timer} has the roll, evaluate and format stages
+    lapped on it.'''
+    system = systems.get(name)
+    raw = system.roll(params, rng)
+    timer.lap('roll')
+    result = system.evaluate(params, raw)
+    timer.lap('evaluate')
+    reply, action = system.format(params, raw, result, nick, note, style)
+    timer.lap('format')
+    return Rolled(system, params, raw, result, reply, action)
+
+def rollSystem(name, args, rng=None, nick=None, note=None, style=None,
+               timer=_notTimed):
+    '''Checks {args} for the system {name} and rolls them, returning a
+    Rolled.'''
+    params = check(name, args)
+    timer.lap('parse')
+    return rollChecked(name, params, rng, nick, note, style, timer)
+
+## Dice expressions
+def describeTerm(term):
+    '''Returns how one term of a rolled expression reads in a reply.'''
+    node = term.node
+    if isinstance(node, expr.Const):
+        return str(node.value)
+    if isinstance(node, expr.Dice):
+        rolled = "[%s]"%formatting.faces(term.dice)
+        if term.dropped:
+            rolled += " (dropped %s)"%formatting.faces(term.dropped)
+        if node.target:
+            rolled += " %s%s %s"%(node.target[0], node.target[1],
+                "%s hits"%term.value if term.value else "no hits")
+        return rolled
+    return systems.get(node.name).describe(node.params, term.dice,
+                                           term.extra)
+
+def describeRoll(terms):
+    '''Returns a rolled expression as it reads in a reply.'''
+    pieces = []
+    for term in terms:
+        if pieces or term.sign < 0:
+            pieces.append("+" if term.sign > 0 else "-")
+        pieces.append(describeTerm(term))
+    return ' '.join(pieces)
+
+def rollVerdict(terms):
+    '''Returns the verdict of a lone system roll, for tallying.'''
+    if len(terms) != 1 or not isinstance(terms[0].node, expr.System):
+        return None
+    return systems.get(terms[0].node.name).verdict(terms[0].extra)
+
+def rollExpression(text, rng=None, nick=None, timer=_notTimed):
+    '''Rolls the dice expression {text}, returning (total, terms, reply).'''
+    plan = expr.compile(text)
+    timer.lap('parse')
+    total, terms = expr.evaluate(plan, rng)
+    timer.lap('roll')
+    reply = "%s = %s"%(describeRoll(terms), total)
+    if nick:
+        reply = "%s: %s"%(nick, reply)
+    timer.lap('format')
+    return total, terms, reply
+
+## Bulk rolls
+def bulkText(system, rest=None):
+    '''Returns the expression the rolls command makes of {system} (a system
+    name or the start of an expression) and the rest of its arguments.'''
+    #systems and their arguments become the built-in forms
+    if systems.isSystem(system):
+        return "%s(%s)"%(system, ','.join(rest.split()) if rest else '')
+    return ' '.join(filter(None, (system, rest)))
+
+def bulkRolls(text, count, rng=None, lineLength=350, timer=_notTimed,
+              maxLines=None):
+    '''Rolls the expression {text} {count} times, returning a summary and
+    the detail of the rolls as lines at most {lineLength} long, at most
+    {maxLines} of them.'''
+    plan = expr.compile(text)
+    timer.lap('parse')
+    tally = bulk.Tally()
+    results = tally.watch(bulk.rolls(plan, count, rng), rollVerdict)
+    details = ("#%s %s"%(n, describeRoll(terms))
+               for n, (total, terms) in enumerate(results, 1))
+    packed = bulk.chunks(details, lineLength, ' | ')
+    lines = list(islice(packed, maxLines))
+    cut = next(packed, None) is not None
+    #rolls past the last line are still counted, just not described
+    for _ in results:
+        pass
+    #rolling and describing are interleaved, so they're timed as one
+    timer.lap('roll')
+    summary = "%s rolls of %s: average %.2f, lowest %s, highest %s"%(
+        count, text, tally.average(), tally.lowest, tally.highest)
+    if tally.outcomes:
+        summary += " (%s)"%', '.join("%s %s"%(n, label) for label, n in
+                                     sorted(tally.outcomes.iteritems()))
+    if cut:
+        summary += "; the detail is cut short after %s lines"%len(lines)
+    timer.lap('format')
+    return summary, lines
+
+## ORE wiggle dice
+def wiggleReport(wiggles, faces, goal=None):
+    '''Works out what {wiggles} ORE wiggle dice should be set to, added to
+    the rolled {faces}, returning the wiggle command's reply.'''
+    ore = systems.get('ore')
+    if not 1 <= wiggles <= ore.MAX_WIGGLE:
+        raise ValueError("You can have between 1 and %s wiggle dice."%
+                         ore.MAX_WIGGLE)
+    if len(faces) > ore.MAX_POOL + 2:
+        raise ValueError("That's more dice than an ORE pool can have.")
+    counts = [0] * 10
+    for face in faces:
+        if not 1 <= face <= 10:
+            raise ValueError("They're d10s, you idiot. You can't roll a side that doesn't exist.")
+        counts[face-1] += 1
+    wiggled, counts = ore.best(counts, wiggles, goal or "wide")
+    result = ore.resolve(counts, wiggled)
+    reply = "set %s to %s: %s"%("it" if wiggles == 1 else "them",
+        formatting.faces(wiggled), ', '.join("%sx%s"%match
+                                             for match in result.sets))
+    if result.loose:
+        reply += " (loose %s)"%formatting.faces(result.loose)
+    return reply
+
+## Odds and simulations
+def oddsReport(system, num, opt=None, kind=None):
+    '''Works out the exact odds of a roll, returning the odds command's
+    reply.'''
+    import odds
+    if opt and system != "owod":
+        raise ValueError("Only owod takes a difficulty.")
+    if system == "owod":
+        if not opt: opt = 6
+        chances = odds.owod(num, opt)
+        average = sum(k*p for k, p in enumerate(chances['successes']))
+        return "%s dice at difficulty %s: success %s, failure %s, botch %s, average %.2f successes"%(
+            num, opt, pct(chances['success']), pct(chances['failure']),
+            pct(chances['botch']), float(average))
+    elif system == "ore":
+        chances = odds.ore(num)
+        widths = ', '.join("%sx %s"%(w, pct(p))
+            for w, p in enumerate(chances['width']) if w > 1 and p)
+        reply = "%s dice: match %s"%(num, pct(chances['match']))
+        if widths:
+            reply += " (widest set %s)"%widths
+        return reply
+    dh = systems.get('dh')
+    if kind and not dh.isValidKind(kind):
+        raise ValueError("%s isn't an attack kind I know."%kind)
+    chances = odds.dh(num, dh.isValidRanged(kind))
+    reply = "test %s: success %s, failure %s"%(num,
+        pct(chances['success']), pct(chances['failure']))
+    if chances['critical']:
+        reply += ", critical failure %s"%pct(chances['critical'])
+    if chances['jam']:
+        reply += ", jam %s"%pct(chances['jam'])
+    if chances['success']:
+        average = sum(d*p for d, p in chances['degrees'].iteritems())
+        reply += ", average %.1f° on a success"%float(
+            average/chances['success'])
+    return reply
+
+def simulateArgs(system, num, opt=None, kind=None):
+    '''Returns the check arguments the simulate command makes of its
+    own.'''
+    if opt and system != "owod":
+        raise ValueError("Only owod takes a difficulty.")
+    if system == "owod": return (num, opt)
+    elif system == "dh": return (num, kind)
+    return (num,)
+
+def simulateReport(system, trials, params, timeout=None):
+    '''Runs a simulation of {trials} rolls of checked {params}, returning
+    the simulate command's reply.'''
+    import simulate
+    tally = simulate.run(system, trials, params, timeout=timeout)
+    share = lambda n: pct(float(n)/trials)
+    if system == "owod":
+        spread = ', '.join("%s:%s"%(k, share(n))
+                           for k, n in enumerate(tally['successes']) if n)
+        return "%s rolls of %s dice at %s: botch %s, successes %s"%(
+            trials, params[0], params[1], share(tally['botches']), spread)
+    elif system == "ore":
+        widths = ', '.join("%sx %s"%(w, share(n))
+                           for w, n in enumerate(tally['width']) if w and n)
+        heights = ', '.join("%s:%s"%(h, share(n))
+                            for h, n in enumerate(tally['height']) if h and n)
+        reply = "%s rolls of %s dice: match %s"%(
+            trials, params[0], share(tally['matches']))
+        if widths:
+            reply += ", widest set %s, its height %s"%(widths, heights)
+        return reply
+    reply = "%s tests at %s: success %s, failure %s"%(trials, params[0],
+        share(tally['success']), share(tally['failure']))
+    if tally['critical']:
+        reply += ", critical failure %s"%share(tally['critical'])
+    if tally['jam']:
+        reply += ", jam %s"%share(tally['jam'])
+    if tally['locations']:
+        reply += ", hits %s"%', '.join("%s %s"%(hit, share(n))
+            for hit, n in sorted(tally['locations'].iteritems()))
+    return reply
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,213 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Dark Heresy: a d100 test, where rolling at or under the test succeeds by
+a degree per full 10 points. Ranged attacks can jam, and auto and semi fire
+spread extra hits over the hit location table."""
+
+from collections import namedtuple
+
+import dice
+import formatting
+
+NAME = "dh"
+#highest test we'll roll against
+MAX_TEST = 300
+#attack kinds we understand
+RANGED = ("auto", "semi")
+MELEE = ()
+#words a dh(...) expression may use as arguments
+WORDS = RANGED + MELEE
+
+Result = namedtuple('Result', 'outcome degrees hits')
+
+def isValidKind(kind):
+    '''Checks to see if {kind} is a valid attack kind.'''
+    return isValidRanged(kind) or isValidMelee(kind)
+
+def isValidRanged(kind):
+    '''Checks to see if {kind} is a valid ranged attack kind.'''
+    return kind in RANGED
+
+def isValidMelee(kind):
+    '''Checks to see if {kind} is a valid melee attack kind.'''
+    return kind in MELEE
+
+def check(test, kind=None):
+    '''Validates a test against {test} with an attack of {kind}, returning
+    its params.'''
+    if not 1 <= test <= MAX_TEST:
+        raise ValueError("You must roll a difficulty between 1 and %s"%MAX_TEST)
+    if kind and not isValidKind(kind):
+        raise ValueError("%s isn't an attack kind I know."%kind)
+    return (test, kind or None)
+
+def roll(params, rng=None):
+    '''Rolls against a d%.'''
+    return dice.rollDie(100, rng)
+
+#where a hit can land, in the order of the hit table
+LOCATIONS = ("Head", "Right Arm", "Left Arm", "Body", "Right Leg", "Left Leg")
+#the highest (reversed) roll that lands on each of LOCATIONS
+_BOUNDS = (10, 20, 30, 70, 85, 100)
+#_BOXES[roll] is the index into LOCATIONS that a d100 roll of {roll} hits.
+#the roll's digits are reversed first, so 37 lands where 73 would.
+_BOXES = (None,) + tuple(
+    [x for x, bound in enumerate(_BOUNDS)
+     if int(str(roll)[::-1]) <= bound][0] for roll in xrange(1, 101))
+
+#follow-up hits only name the body part, not the side
+AREAS = ("Head", "Arm", "Body", "Leg")
+#_AREA[box] is the index into AREAS of LOCATIONS[box]
+_AREA = (0, 1, 1, 2, 3, 3)
+#_FOLLOW[area] is where the third, fourth, fifth and sixth-onward hits of a
+#volley land when the first hit {area}, as indices into AREAS.
+_FOLLOW = ((1, 2, 1, 2),
+           (2, 0, 2, 1),
+           (1, 0, 1, 2),
+           (2, 1, 0, 2))
+
+def location(roll):
+    '''Matches percentile rolls to their corresponding hit box, and
+    returns the box that was hit.'''
+    return LOCATIONS[_BOXES[roll]]
+
+def followUps(box, degrees):
+    '''Returns where the hits after the second land, as (area, times)
+    pairs, for a volley whose first hit was LOCATIONS[{box}].'''
+    follow = _FOLLOW[_AREA[box]]
+    #hits three to five each get their own entry; everything after that
+    #piles onto the sixth
+    extra = degrees - 2
+    hits = [(AREAS[area], 1) for area in follow[:min(extra, 2)+1]]
+    if extra >= 3:
+        hits.append((AREAS[follow[3]], extra-2))
+    return hits
+
+def volley(roll, degrees, kind):
+    '''Returns every hit a successful ranged attack of {kind} ("auto" or
+    "semi") scores with {roll} and {degrees} of success, as (location,
+    times) pairs.'''
+    #in semi mode, need two degrees per extra hit
+    if kind == "semi":
+        degrees //= 2
+    box = _BOXES[roll]
+    hits = [(LOCATIONS[box], 1)]
+    #second hit always matches the first
+    if degrees > 1:
+        hits.append(hits[0])
+    if degrees > 2:
+        hits += followUps(box, degrees)
+    return hits
+
+def formatHits(hits):
+    '''Returns (location, times) pairs as a comma delimited string.'''
+    return ', '.join(name if times == 1 else "%sx%s"%(name, times)
+                     for name, times in hits)
+
+def resolve(roll, test, ranged=False):
+    '''Scores a d100 {roll} against {test}, returning (outcome, degrees)
+    where outcome is one of "jam", "critical", "success" or "failure".'''
+    #a ranged weapon jams on 96+ before anything else is checked
+    if roll >= 96 and ranged:
+        return "jam", 0
+    elif roll == 100:
+        return "critical", 0
+    elif roll <= test:
+        return "success", (test-roll) // 10
+    else:
+        return "failure", (roll-test) // 10
+
+
+def evaluate(params, roll):
+    '''Scores the d100 {roll}, working out every hit if it was a
+    successful ranged attack.'''
+    test, kind = params
+    outcome, degrees = resolve(roll, test, isValidRanged(kind))
+    hits = None
+    if outcome == "success" and isValidRanged(kind):
+        hits = volley(roll, degrees, kind)
+    return Result(outcome, degrees, hits)
+
+def score(result):
+    '''Returns the number a result adds to a dice expression.'''
+    return result.degrees if result.outcome == "success" else 0
+
+#each outcome as something a roll did, so a tally reads "3 jammed"
+_VERDICTS = {"success": "succeeded", "failure": "failed",
+             "critical": "failed critically", "jam": "jammed"}
+
+def verdict(result):
+    '''Returns what the roll did, as counted by a tally of rolls.'''
+    return _VERDICTS[result.outcome]
+
+def logEntry(params, roll, result):
+    '''Returns the roll as (args, outcome, success, dice) for the roll
+    log. The attack kind is logged as 0 for none, else 1 + its index in
+    WORDS.'''
+    test, kind = params
+    kind = WORDS.index(kind) + 1 if kind else 0
+    return (test, kind), result.degrees, result.outcome == "success", [roll]
+
+def describe(params, roll, result):
+    '''Returns the roll as one term of a dice expression.'''
+    args = ','.join(str(x) for x in params if x)
+    text = result.outcome
+    if result.outcome == "success" and result.degrees:
+        text += " by %s°"%result.degrees
+    if result.hits:
+        text += " (%s)"%formatHits(result.hits)
+    return "%s(%s) [%s] %s"%(NAME, args, roll, text)
+
+def format(params, roll, result, nick=None, note=None, style=None):
+    '''Returns the dh command's (reply, action), worded in {style} (a
+    formatting.Style, verbose by default).'''
+    if style is None: style = formatting.style()
+    test, kind = params
+    degrees = style["dh.degrees"]%result.degrees if result.degrees else ""
+    if result.outcome == "jam":
+        outcome = style["dh.jam"]
+    elif result.outcome == "critical":
+        outcome = style["dh.critical"]
+    elif result.outcome == "success":
+        #reflect combat mode if an attack kind was given
+        outcome = style["dh.hit" if kind else "dh.success"]%degrees
+    else:
+        outcome = style["dh.failure"]%degrees
+    return "".join((style["dh.nick"]%nick if nick else "", outcome,
+                    style["dh.roll"]%formatting.label(roll),
+                    style["dh.hits"]%formatHits(result.hits)
+                    if result.hits else "",
+                    style["dh.note"]%note if note else "")), False
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
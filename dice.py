@@ -0,0 +1,195 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""The dice engine behind every RPGDice command.
+
+Pools are rolled in bulk, a whole block of dice per RNG call, and come back
+as a histogram of faces rather than a sorted list of dice. Rerolls and
+exploding dice are rolled a wave at a time, each wave one bulk roll, and
+stop after MAX_WAVES waves or MAX_EXTRA extra dice however the dice fall."""
+
+import random
+from array import array
+from itertools import repeat
+
+#largest pool a single histogram slot can count.
+MAX_DICE = 65535
+#pools at least this big go through numpy when it's available; below it the
+#numpy call overhead costs more than the python loop it replaces.
+NUMPY_MIN = 64
+#most random bits pulled out of the RNG in one call.
+BLOCK_BITS = 256
+#most waves of rerolls or explosions rolled for one pool.
+MAX_WAVES = 10
+#most dice explosions may add to one pool.
+MAX_EXTRA = 1000
+
+#shared generator for callers that don't bring their own.
+_rng = random.Random()
+#numpy, once getNumpy() has tried to import it; it's slow to import, so we
+#wait until a pool is big enough to want it.
+_numpy = _untried = object()
+#{sides: dice per RNG call} so we only work it out once per die type.
+_blocks = {}
+
+def getNumpy():
+    '''Returns numpy, importing it the first time, or None if it isn't
+    installed.'''
+    global _numpy
+    if _numpy is _untried:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+def _blockSize(sides):
+    '''Returns how many {sides}-sided dice fit into a single RNG draw; call
+    it with two or more {sides}, since any number of one-sided dice fit.'''
+    try:
+        return _blocks[sides]
+    except KeyError:
+        size = 1
+        limit = 1 << BLOCK_BITS
+        while sides ** (size+1) <= limit:
+            size += 1
+        _blocks[sides] = size
+        return size
+
+def _check(sides, num):
+    '''Raises ValueError if {num} dice of {sides} sides can't be rolled.'''
+    if sides < 1:
+        raise ValueError("Dice must have at least one side.")
+    if num < 0 or num > MAX_DICE:
+        raise ValueError("You can only roll between 0 and %s dice."%MAX_DICE)
+
+def _draws(sides, num, rng):
+    '''Returns the zero-based faces of {num} dice of {sides} sides.
+
+    Generators with a faces() method (see rngs) roll the lot themselves.
+    Otherwise each block of dice is one uniform draw below sides**block,
+    split back into its base-{sides} digits; every digit is an independent,
+    unbiased die.'''
+    faces = getattr(rng, 'faces', None)
+    if faces is not None:
+        return faces(sides, num)
+    return _digits(sides, num, rng)
+
+def _digits(sides, num, rng):
+    '''Yields {num} zero-based faces drawn a block at a time.'''
+    if sides == 1:
+        #a one-sided die can only show its one face
+        for _ in repeat(None, num):
+            yield 0
+        return
+    block = _blockSize(sides)
+    while num > 0:
+        size = min(block, num)
+        x = rng.randrange(sides ** size)
+        for _ in repeat(None, size):
+            x, face = divmod(x, sides)
+            yield int(face)
+        num -= size
+
+def rollDie(sides, rng=None):
+    '''Rolls a single die of {sides} sides.'''
+    return (rng or _rng).randint(1, sides)
+
+def rollFaces(sides, num, rng=None):
+    '''Rolls {num} dice of {sides} sides and returns the faces, unsorted.'''
+    _check(sides, num)
+    if rng is None and num >= NUMPY_MIN and getNumpy() is not None:
+        return _numpy.random.randint(1, sides+1, num).tolist()
+    return [face+1 for face in _draws(sides, num, rng or _rng)]
+
+def rollCounts(sides, num, rng=None):
+    '''Rolls {num} dice of {sides} sides and returns their histogram: an
+    array where index {n} holds how many dice came up {n+1}.'''
+    _check(sides, num)
+    if rng is None and num >= NUMPY_MIN and getNumpy() is not None:
+        faces = _numpy.random.randint(0, sides, num)
+        return array('H', _numpy.bincount(faces, minlength=sides).tolist())
+    counts = array('H', [0]) * sides
+    for face in _draws(sides, num, rng or _rng):
+        counts[face] += 1
+    return counts
+
+def rerollOnce(sides, faces, low, rng=None):
+    '''Rerolls, once and in place, every die in {faces} showing {low} or
+    less. Returns {faces}.'''
+    lows = [x for x, face in enumerate(faces) if face <= low]
+    for x, face in zip(lows, rollFaces(sides, len(lows), rng)):
+        faces[x] = face
+    return faces
+
+def rerollUntil(sides, faces, low, rng=None, waves=MAX_WAVES):
+    '''Rerolls, in place, every die in {faces} showing {low} or less until
+    it shows more, giving up after {waves} waves and leaving whatever's
+    still low where it is. Returns {faces}.'''
+    lows = [x for x, face in enumerate(faces) if face <= low]
+    for _ in repeat(None, waves):
+        if not lows:
+            break
+        again = []
+        for x, face in zip(lows, rollFaces(sides, len(lows), rng)):
+            faces[x] = face
+            if face <= low:
+                again.append(x)
+        lows = again
+    return faces
+
+def explode(sides, faces, high, rng=None, waves=MAX_WAVES, most=MAX_EXTRA):
+    '''Rolls an extra die for every die in {faces} showing {high} or more,
+    then for every extra die that does, and so on, for at most {waves}
+    waves and {most} extra dice. Returns the extra dice in the order they
+    were rolled.'''
+    extra = []
+    wave = faces
+    for _ in repeat(None, waves):
+        count = min(len([face for face in wave if face >= high]),
+                    most - len(extra))
+        if count <= 0:
+            break
+        wave = rollFaces(sides, count, rng)
+        extra += wave
+    return extra
+
+def expand(counts):
+    '''Turns a histogram back into a list of dice sorted low to high.'''
+    ret = []
+    for face, num in enumerate(counts, 1):
+        if num: ret += [face] * num
+    return ret
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,295 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Dice expressions such as 4d6kh3+2, 10d10>=7! or 3d20r1.
+
+An expression is parsed once into a plan, a tuple of signed terms, which is
+kept in a small LRU cache keyed by the expression text; rolling it again
+just evaluates the cached plan. The oWoD, ORE and Dark Heresy rules are
+built-in forms, owod(pool[,diff]), ore(pool[,called[,expert[,wiggle]]]) and
+dh(test[,kind]), that run on the same evaluator; so does any other system
+in the registry.
+
+Dice modifiers, applied in this order whatever order they're written in:
+    rN      reroll, once, every die showing N or less
+    rrN     reroll every die showing N or less until it shows more
+    ![N]    explode: roll another die for each one showing N (default the
+            highest face) or more
+    khN/klN keep the highest/lowest N dice
+    >=N, >N, <=N, <N, =N
+            count the dice that pass instead of adding them up"""
+
+import re
+import threading
+from collections import namedtuple, OrderedDict
+
+import dice
+import systems
+
+#most dice a single term may start with
+MAX_DICE = 100
+#most sides a die may have
+MAX_SIDES = 1000
+#most terms in one expression
+MAX_TERMS = 10
+#most waves of rerolls or exploding dice rolled for one term
+MAX_WAVES = dice.MAX_WAVES
+#how many compiled plans we keep around
+CACHE_SIZE = 256
+
+Dice = namedtuple('Dice', 'count sides reroll until explode keep target')
+Const = namedtuple('Const', 'value')
+System = namedtuple('System', 'name params')
+Term = namedtuple('Term', 'sign node value dice dropped extra')
+
+_token = re.compile(r'\s*(?:(\d+)|([a-z]+)|(>=|<=|[-+!(),<>=]))')
+_compare = {'>=': lambda x, n: x >= n,
+            '>': lambda x, n: x > n,
+            '<=': lambda x, n: x <= n,
+            '<': lambda x, n: x < n,
+            '=': lambda x, n: x == n}
+
+class ParseError(ValueError):
+    """Raised for an expression that can't be compiled."""
+    pass
+
+def _tokenize(text):
+    '''Splits {text} into a list of tokens: ints, words and symbols.'''
+    tokens = []
+    pos = 0
+    text = text.lower().rstrip()
+    while pos < len(text):
+        match = _token.match(text, pos)
+        if not match:
+            raise ParseError("I don't understand %r."%text[pos:].strip())
+        number, word, symbol = match.groups()
+        tokens.append(int(number) if number else word or symbol)
+        pos = match.end()
+    return tokens
+
+class _Parser(object):
+    '''Recursive descent over a token list; see the module docstring.'''
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def number(self, what):
+        token = self.take()
+        if not isinstance(token, int):
+            raise ParseError("Expected %s, not %r."%(what, token))
+        return token
+
+    def expression(self):
+        terms = []
+        sign = 1
+        if self.peek() in ('+', '-'):
+            sign = -1 if self.take() == '-' else 1
+        while True:
+            terms.append((sign, self.term()))
+            if len(terms) > MAX_TERMS:
+                raise ParseError("That's too many terms.")
+            token = self.take()
+            if token is None:
+                return tuple(terms)
+            if token not in ('+', '-'):
+                raise ParseError("Expected + or -, not %r."%token)
+            sign = -1 if token == '-' else 1
+
+    def term(self):
+        token = self.peek()
+        if systems.isSystem(token):
+            return self.system()
+        count = 1
+        if isinstance(token, int):
+            count = self.take()
+            if self.peek() != 'd':
+                return Const(count)
+        if self.take() != 'd':
+            raise ParseError("Expected dice like 2d6, a number or a system.")
+        return self.dice(count)
+
+    def dice(self, count):
+        sides = self.number("the number of sides")
+        if not 1 <= count <= MAX_DICE:
+            raise ParseError("You can roll between 1 and %s dice."%MAX_DICE)
+        if not 2 <= sides <= MAX_SIDES:
+            raise ParseError("Dice can have 2 to %s sides."%MAX_SIDES)
+        reroll = explode = keep = target = None
+        until = False
+        while self.peek() not in ('+', '-', None):
+            token = self.take()
+            if token in ('r', 'rr'):
+                reroll = self.number("a face to reroll")
+                until = token == 'rr'
+                if not 1 <= reroll < sides:
+                    raise ParseError("You can only reroll 1 to %s."%(sides-1))
+            elif token == '!':
+                explode = sides
+                if isinstance(self.peek(), int):
+                    explode = self.take()
+                if not 2 <= explode <= sides:
+                    raise ParseError("Dice can only explode on 2 to %s."%sides)
+            elif token in ('kh', 'kl'):
+                keep = (token[1], 1)
+                if isinstance(self.peek(), int):
+                    keep = (token[1], self.take())
+                if not 1 <= keep[1] <= count:
+                    raise ParseError("You can keep between 1 and %s dice."%
+                                     count)
+            elif token in _compare:
+                target = (token, self.number("a target number"))
+            else:
+                raise ParseError("%r isn't a dice modifier."%token)
+        return Dice(count, sides, reroll, until, explode, keep, target)
+
+    def system(self):
+        name = self.take()
+        if self.take() != '(':
+            raise ParseError("Expected %s(...)."%name)
+        #one token per comma-separated slot; an empty slot is an argument
+        #left out, as None, so the ones after it keep their places
+        args = [None]
+        while True:
+            token = self.take()
+            if token is None:
+                raise ParseError("Expected a closing ).")
+            if token == ')':
+                break
+            if token == ',':
+                args.append(None)
+            elif args[-1] is not None:
+                raise ParseError("Expected , or ), not %r."%token)
+            else:
+                args[-1] = token
+        if args == [None]:
+            args = []
+        return _checkSystem(name, tuple(args))
+
+def _checkSystem(name, args):
+    '''Validates a built-in form the same way its command does.'''
+    system = systems.get(name)
+    words = getattr(system, 'WORDS', ())
+    for arg in args:
+        if arg is not None and not isinstance(arg, int) and \
+           arg not in words:
+            raise ParseError("%r isn't something %s() takes."%(arg, name))
+    try:
+        return System(name, system.check(*args))
+    except TypeError:
+        raise ParseError("That's the wrong number of arguments for %s()."%
+                         name)
+    except ValueError as e:
+        raise ParseError(str(e))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def compile(text):
+    '''Returns the plan for the expression {text}, parsing it only if it
+    isn't cached already.'''
+    key = ' '.join(text.lower().split())
+    _lock.acquire()
+    try:
+        plan = _cache.pop(key, None)
+        if plan is not None:
+            _cache[key] = plan
+            return plan
+    finally:
+        _lock.release()
+    plan = _Parser(_tokenize(key)).expression()
+    _lock.acquire()
+    try:
+        _cache[key] = plan
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    finally:
+        _lock.release()
+    return plan
+
+def _rollDice(node, rng):
+    '''Rolls a Dice node, returning (value, kept dice, dropped dice).'''
+    faces = dice.rollFaces(node.sides, node.count, rng)
+    if node.until:
+        dice.rerollUntil(node.sides, faces, node.reroll, rng, MAX_WAVES)
+    elif node.reroll:
+        dice.rerollOnce(node.sides, faces, node.reroll, rng)
+    if node.explode:
+        faces += dice.explode(node.sides, faces, node.explode, rng,
+                              MAX_WAVES)
+    dropped = []
+    if node.keep:
+        faces.sort(reverse=node.keep[0] == 'h')
+        faces, dropped = faces[:node.keep[1]], faces[node.keep[1]:]
+    if node.target:
+        test = _compare[node.target[0]]
+        return len([face for face in faces if test(face, node.target[1])]), \
+               faces, dropped
+    return sum(faces), faces, dropped
+
+def _rollSystem(node, rng):
+    '''Rolls a built-in form, returning (value, raw roll, result).'''
+    system = systems.get(node.name)
+    raw = system.roll(node.params, rng)
+    result = system.evaluate(node.params, raw)
+    return system.score(result), raw, result
+
+def evaluate(plan, rng=None):
+    '''Rolls a compiled plan and returns (total, [Term, ...]).'''
+    terms = []
+    total = 0
+    for sign, node in plan:
+        dropped = extra = None
+        if isinstance(node, Const):
+            value, faces = node.value, None
+        elif isinstance(node, Dice):
+            value, faces, dropped = _rollDice(node, rng)
+        else:
+            value, faces, extra = _rollSystem(node, rng)
+        total += sign * value
+        terms.append(Term(sign, node, value, faces, dropped, extra))
+    return total, terms
+
+def roll(text, rng=None):
+    '''Compiles (or fetches) and evaluates the expression {text}.'''
+    return evaluate(compile(text), rng)
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
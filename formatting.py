@@ -0,0 +1,176 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""The fixed text of every dice reply, kept in one place so a style or
+locale can change how the bot talks without touching the roll logic.
+
+A style is a table of fragments, looked up once per (locale, style) and
+cached. The systems' format functions fill the fragments in, building each
+reply with a single join, and dice are written out from labels rendered
+when the module loads."""
+
+from itertools import chain, repeat
+
+#styles a channel can pick
+STYLES = ("verbose", "compact")
+#locale every other locale falls back to, fragment by fragment
+DEFAULT_LOCALE = "en"
+#labels are pre-rendered for faces up to this; bigger ones are str()'d
+MAX_LABEL = 1000
+
+LABELS = tuple(str(face) for face in xrange(MAX_LABEL+1))
+
+#_TEXT[locale][style] holds the fragments that differ from the locale's
+#verbose style, which in turn holds those that differ from DEFAULT_LOCALE's.
+_TEXT = {
+    "en": {
+        "verbose": {
+            #separates dice in a list
+            "sep": ", ",
+            #whether owod replies are sent as actions
+            "action": True,
+            #(user) rolls (rolls) to (note). (N successes|failure|botch!)
+            "owod.auto": "Somehow, against all odds, in a true show of "
+                         "epic talent, you manage to succeed%s.",
+            "owod.times": " %s times",
+            "owod.tooHigh": "You fail. Probably because you're too stupid "
+                            "to even know how many sides a d10 has.",
+            "owod.roll": "rolls %s%s (%s)",
+            "owod.note": " to %s.",
+            "owod.success": "1 success",
+            "owod.successes": "%s successes",
+            "owod.botch": "botch!",
+            "owod.failure": "failure",
+            #(sets): [(rolls)] ((note), called:x, expert:y)
+            "ore.roll": "%s: [%s]%s",
+            "ore.set": "%sx%s",
+            "ore.none": "",
+            "ore.extra": " (%s)",
+            "ore.called": "called:%s",
+            "ore.expert": "expert:%s",
+            "ore.wiggle": "wiggle:%s",
+            #(nick): (outcome) [(roll)] ((hits)) ((note))
+            "dh.nick": "%s: ",
+            "dh.jam": "your weapon jams! (reroll if using unjammable "
+                      "weapon)",
+            "dh.critical": "a critical failure!",
+            "dh.success": "a success%s!",
+            "dh.hit": "a successful hit%s!",
+            "dh.failure": "unsuccessful%s.",
+            "dh.degrees": " by %s°",
+            "dh.roll": " [%s]",
+            "dh.hits": " (%s)",
+            "dh.note": " (%s)",
+        },
+        "compact": {
+            "sep": " ",
+            "action": False,
+            "owod.auto": "success%s (difficulty 1)",
+            "owod.times": " x%s",
+            "owod.tooHigh": "failure (difficulty over 10)",
+            "owod.roll": "%s%s: %s",
+            "owod.note": " (%s)",
+            "ore.roll": "%s [%s]%s",
+            "ore.none": "no sets",
+            "dh.jam": "jam",
+            "dh.critical": "critical failure",
+            "dh.success": "success%s",
+            "dh.hit": "hit%s",
+            "dh.failure": "failure%s",
+            "dh.degrees": " %s°",
+        },
+    },
+}
+
+class Style(object):
+    """Every fragment of one style in one locale, looked up by name."""
+    def __init__(self, name, locale, text):
+        self.name = name
+        self.locale = locale
+        self.text = text
+        self.sep = text["sep"]
+        self.action = text["action"]
+
+    def __getitem__(self, fragment):
+        return self.text[fragment]
+
+    def faces(self, values):
+        '''Returns the dice {values} as a list in this style.'''
+        return faces(values, self.sep)
+
+    def counts(self, counts):
+        '''Returns the dice in the histogram {counts} as a list in this
+        style, low to high.'''
+        return histogram(counts, self.sep)
+
+_styles = {}
+
+def style(name="verbose", locale=DEFAULT_LOCALE):
+    '''Returns the Style {name} in {locale}, falling back to the verbose
+    style and DEFAULT_LOCALE for anything they don't say differently.'''
+    key = (name, locale)
+    try:
+        return _styles[key]
+    except KeyError:
+        pass
+    if name not in STYLES:
+        raise ValueError("%s isn't a reply style I know."%name)
+    text = {}
+    for place in (DEFAULT_LOCALE, locale):
+        for layer in ("verbose", name):
+            text.update(_TEXT.get(place, {}).get(layer, {}))
+    #styles never change once built, so racing threads just build twins
+    _styles[key] = result = Style(name, locale, text)
+    return result
+
+def label(face):
+    '''Returns the face {face} as text.'''
+    if 0 <= face <= MAX_LABEL:
+        return LABELS[face]
+    return str(face)
+
+def faces(values, sep=", "):
+    '''Returns the dice {values} joined by {sep}.'''
+    try:
+        return sep.join([LABELS[value] for value in values])
+    except IndexError:
+        #a face too big for the labels
+        return sep.join([label(value) for value in values])
+
+def histogram(counts, sep=", "):
+    '''Returns the dice in the histogram {counts} joined by {sep}, low to
+    high, without expanding it into a list of faces first.'''
+    return sep.join(chain.from_iterable(
+        repeat(label(face), n) for face, n in enumerate(counts, 1) if n))
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,177 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Rate limiting and request coalescing for RPGDice's commands.
+
+Every dice command costs a token from its caller's bucket and from the
+bucket of the channel it was sent in, so one user looping a roll, or one
+busy channel, runs dry without holding up anyone else's replies. Heavy
+requests that are identical and in flight at the same time share one
+run."""
+
+import threading
+import time
+
+class TokenBucket(object):
+    """Holds up to {burst} tokens, refilled at {rate} tokens a second."""
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp', 'warned')
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+        #whether the caller's been told they're out since their last token
+        self.warned = False
+
+    def refill(self, now):
+        '''Adds the tokens earned since the bucket was last touched.'''
+        if now > self.stamp:
+            self.tokens = min(self.burst,
+                              self.tokens + (now-self.stamp)*self.rate)
+        self.stamp = now
+
+    def full(self, now):
+        '''Returns whether the bucket would be full at {now}.'''
+        return self.tokens + (now-self.stamp)*self.rate >= self.burst
+
+class Limiter(object):
+    """A token bucket per key, created full the first time a key is seen
+    and forgotten once it's full again."""
+    #how often, in seconds, full buckets are swept out
+    SWEEP = 300
+
+    def __init__(self):
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self._swept = time.time()
+
+    def take(self, keys, now=None):
+        '''Takes a token from the bucket of every (key, perMinute, burst)
+        in {keys}, all or nothing; a perMinute of 0 means that key isn't
+        limited. Returns None if the tokens were taken, else the key that
+        ran out and whether this is the first refusal since it last had a
+        token, so the caller only has to say so once.'''
+        if now is None: now = time.time()
+        self._lock.acquire()
+        try:
+            if now - self._swept > self.SWEEP:
+                self._sweep(now)
+            buckets = []
+            for key, perMinute, burst in keys:
+                if not perMinute:
+                    continue
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(perMinute/60.0, burst, now)
+                    self.buckets[key] = bucket
+                else:
+                    #limits may have been changed since it was made
+                    bucket.rate = perMinute/60.0
+                    bucket.burst = burst
+                    bucket.refill(now)
+                if bucket.tokens < 1:
+                    first = not bucket.warned
+                    bucket.warned = True
+                    return key, first
+                buckets.append(bucket)
+            for bucket in buckets:
+                bucket.tokens -= 1
+                bucket.warned = False
+            return None
+        finally:
+            self._lock.release()
+
+    def _sweep(self, now):
+        '''Forgets every full bucket; a new one would be identical.'''
+        for key, bucket in self.buckets.items():
+            if bucket.full(now):
+                del self.buckets[key]
+        self._swept = now
+
+    def reset(self):
+        '''Forgets every bucket.'''
+        self._lock.acquire()
+        try:
+            self.buckets.clear()
+        finally:
+            self._lock.release()
+
+class Coalescer(object):
+    """Shares one run of a job between every identical request made while
+    it's in flight."""
+    def __init__(self):
+        self.waiting = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, start, done, failed):
+        '''Has done(result) or failed(exception) called when the job {key}
+        finishes. If it isn't already running, start(done, failed) is
+        called to run it, with callbacks that report to every request that
+        joins in the meantime. Returns whether this request started it.
+        Anything start() raises is passed on, and the job is dropped.'''
+        self._lock.acquire()
+        try:
+            if key in self.waiting:
+                self.waiting[key].append((done, failed))
+                return False
+            self.waiting[key] = [(done, failed)]
+        finally:
+            self._lock.release()
+        try:
+            start(lambda result: self._settle(key, 0, result),
+                  lambda e: self._settle(key, 1, e))
+        except Exception:
+            self._lock.acquire()
+            try:
+                del self.waiting[key]
+            finally:
+                self._lock.release()
+            raise
+        return True
+
+    def _settle(self, key, which, value):
+        '''Hands a finished job's result (which=0) or exception (which=1)
+        to everyone waiting on it.'''
+        self._lock.acquire()
+        try:
+            callbacks = self.waiting.pop(key, ())
+        finally:
+            self._lock.release()
+        for callback in callbacks:
+            callback[which](value)
+
+    def busy(self, key):
+        '''Returns whether the job {key} is in flight.'''
+        return key in self.waiting
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
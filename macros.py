@@ -0,0 +1,148 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Named rolls that players save once and make again by name.
+
+Macros are kept in a small SQLite database, one row per (nick, name), and
+in memory as the params their system's check() already returned, so making
+one skips straight to rolling."""
+
+import json
+import inspect
+import sqlite3
+import threading
+from collections import namedtuple
+
+import systems
+
+#longest a macro name may be
+MAX_NAME = 32
+
+Macro = namedtuple('Macro', 'system params note')
+
+_SCHEMA = '''CREATE TABLE IF NOT EXISTS macros (
+                 nick TEXT NOT NULL,
+                 name TEXT NOT NULL,
+                 system TEXT NOT NULL,
+                 params TEXT NOT NULL,
+                 note TEXT,
+                 PRIMARY KEY (nick, name))'''
+
+def parse(name, words):
+    '''Splits the words after a system's name into the arguments its check()
+    takes and a note, the way its command would: leading numbers (and words
+    the system knows, such as dh's attack kinds) up to as many as it takes,
+    then everything else. Returns (params, note), raising ValueError if the
+    arguments don't check out.'''
+    system = systems.get(name)
+    known = getattr(system, 'WORDS', ())
+    most = len(inspect.getargspec(system.check)[0])
+    args = []
+    for word in words[:most]:
+        try:
+            args.append(int(word))
+        except ValueError:
+            if word.lower() not in known:
+                break
+            args.append(word.lower())
+    if not args:
+        raise ValueError("%s needs some dice."%name)
+    return system.check(*args), ' '.join(words[len(args):]) or None
+
+class MacroStore(object):
+    """The macros kept in the SQLite database {filename}, all loaded into
+    memory when it's opened. Safe to share between threads."""
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        #nicks and notes are whatever bytes came off the wire
+        self._db.text_factory = str
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        #{nick: {name: Macro}}
+        self.macros = {}
+        for nick, name, system, params, note in self._db.execute(
+                'SELECT nick, name, system, params, note FROM macros'):
+            try:
+                #checked again in case the system's rules changed
+                params = systems.get(system).check(*json.loads(params))
+            except (ValueError, TypeError):
+                continue
+            self.macros.setdefault(nick, {})[name] = \
+                Macro(system, params, note)
+
+    def get(self, nick, name):
+        '''Returns {nick}'s macro {name}, or None.'''
+        return self.macros.get(nick, {}).get(name)
+
+    def names(self, nick):
+        '''Returns the names of {nick}'s macros, sorted.'''
+        return sorted(self.macros.get(nick, ()))
+
+    def save(self, nick, name, macro):
+        '''Saves {macro} as {nick}'s macro {name}, replacing any already
+        saved under that name.'''
+        self._lock.acquire()
+        try:
+            self._db.execute('INSERT OR REPLACE INTO macros '
+                             '(nick, name, system, params, note) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (nick, name, macro.system,
+                              json.dumps(macro.params), macro.note))
+            self._db.commit()
+            self.macros.setdefault(nick, {})[name] = macro
+        finally:
+            self._lock.release()
+
+    def remove(self, nick, name):
+        '''Forgets {nick}'s macro {name}, returning whether there was one.'''
+        self._lock.acquire()
+        try:
+            if self.macros.get(nick, {}).pop(name, None) is None:
+                return False
+            self._db.execute('DELETE FROM macros WHERE nick=? AND name=?',
+                             (nick, name))
+            self._db.commit()
+            return True
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._db.close()
+        finally:
+            self._lock.release()
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
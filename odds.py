@@ -0,0 +1,245 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Exact odds for the rolls RPGDice makes.
+
+Every number here is counted, not simulated: each system builds a table of
+outcome counts by dynamic programming the first time it's asked about, and
+every later question is a lookup into that table. Rerolled and exploding
+dice are worked out the same way, stopping after as many waves as the
+dice engine rolls, so what's left of the tail is cut off where the engine
+cuts it off."""
+
+from fractions import Fraction
+
+import dice
+
+#largest pools/tests the commands allow, and so the size of our tables.
+OWOD_MAX = 20
+ORE_MAX = 10
+DH_MAX = 300
+
+#{diff: [[successes...], botches] per pool size}
+_owod = {}
+#{pool: [ways per widest set]}
+_ore = {}
+#{(test, ranged): (outcome counts, {degrees: ways})}
+_dh = {}
+
+def _binomial(n, k):
+    '''Returns n choose k.'''
+    ret = 1
+    for x in xrange(min(k, n-k)):
+        ret = ret * (n-x) // (x+1)
+    return ret
+
+def _owodTable(diff):
+    '''Builds the success/botch counts for every pool at difficulty {diff}.
+
+    A die is a success (faces {diff}-10), a one, or some other failure.
+    We only need to know whether a one turned up, so the state is
+    {successes: [ways with no ones, ways with a one]}.'''
+    hits = 11 - diff
+    ones = 1 if diff > 1 else 0
+    misses = 10 - hits - ones
+    state = [[1, 0]]
+    table = [None]
+    for _ in xrange(OWOD_MAX):
+        new = [[0, 0] for _ in xrange(len(state)+1)]
+        for k, (clean, botched) in enumerate(state):
+            new[k+1][0] += clean * hits
+            new[k+1][1] += botched * hits
+            new[k][0] += clean * misses
+            new[k][1] += botched * misses + (clean + botched) * ones
+        state = new
+        table.append(([clean+botched for clean, botched in state],
+                      state[0][1]))
+    return table
+
+def owod(pool, diff=6):
+    '''Returns the exact odds of an oWoD roll of {pool} dice at {diff}:
+    {'successes': [P(0), P(1), ...], 'success': P, 'failure': P,
+    'botch': P}.'''
+    if not 1 <= pool <= OWOD_MAX:
+        raise ValueError("You must roll between 1 and %s dice."%OWOD_MAX)
+    if not 1 <= diff <= 10:
+        raise ValueError("Difficulty must be between 1 and 10.")
+    try:
+        table = _owod[diff]
+    except KeyError:
+        table = _owod[diff] = _owodTable(diff)
+    ways, botches = table[pool]
+    total = 10 ** pool
+    return {'successes': [Fraction(x, total) for x in ways],
+            'success': Fraction(total - ways[0], total),
+            'failure': Fraction(ways[0] - botches, total),
+            'botch': Fraction(botches, total)}
+
+def _oreTable(pool):
+    '''Counts the ways {pool} d10s can come up, by the width of their widest
+    set.
+
+    Faces are added one at a time; choosing which {c} of the dice still
+    unassigned show this face is {remaining} choose {c} ways. The state is
+    {(dice assigned, widest so far): ways}.'''
+    state = {(0, 0): 1}
+    for _ in xrange(10):
+        new = {}
+        for (used, widest), ways in state.iteritems():
+            left = pool - used
+            for c in xrange(left+1):
+                key = (used+c, max(widest, c))
+                new[key] = new.get(key, 0) + ways * _binomial(left, c)
+        state = new
+    ret = [0] * (pool+1)
+    for (used, widest), ways in state.iteritems():
+        if used == pool:
+            ret[widest] += ways
+    return ret
+
+def ore(pool):
+    '''Returns the exact odds of an ORE roll of {pool} dice:
+    {'width': [P(widest set is 0), P(1), ...], 'match': P}.'''
+    if not 1 <= pool <= ORE_MAX:
+        raise ValueError("You must roll between 1 and %s dice."%ORE_MAX)
+    try:
+        table = _ore[pool]
+    except KeyError:
+        table = _ore[pool] = _oreTable(pool)
+    total = 10 ** pool
+    return {'width': [Fraction(x, total) for x in table],
+            'match': Fraction(sum(table[2:]), total)}
+
+def _dhTable(test, ranged):
+    '''Sorts all 100 rolls against {test} the same way the dh command does.'''
+    counts = {'success': 0, 'failure': 0, 'critical': 0, 'jam': 0}
+    degrees = {}
+    for roll in xrange(1, 101):
+        if roll >= 96 and ranged:
+            counts['jam'] += 1
+        elif roll == 100:
+            counts['critical'] += 1
+        elif roll <= test:
+            counts['success'] += 1
+            deg = (test-roll) // 10
+            degrees[deg] = degrees.get(deg, 0) + 1
+        else:
+            counts['failure'] += 1
+    return counts, degrees
+
+def dh(test, ranged=False):
+    '''Returns the exact odds of a Dark Heresy test against {test}:
+    {'success': P, 'failure': P, 'critical': P, 'jam': P,
+    'degrees': {degrees of success: P}}.'''
+    if not 1 <= test <= DH_MAX:
+        raise ValueError("You must roll a difficulty between 1 and %s"%DH_MAX)
+    key = (test, bool(ranged))
+    try:
+        counts, degrees = _dh[key]
+    except KeyError:
+        counts, degrees = _dh[key] = _dhTable(*key)
+    ret = dict((k, Fraction(v, 100)) for k, v in counts.iteritems())
+    ret['degrees'] = dict((k, Fraction(v, 100)) for k, v in degrees.iteritems())
+    return ret
+
+def rerolled(sides, low, until=False, waves=dice.MAX_WAVES):
+    '''Returns the exact odds of each face of one die of {sides} sides
+    that's rerolled once when it shows {low} or less, or if {until}, up to
+    {waves} times until it shows more: [P(1), P(2), ...].'''
+    if not until:
+        waves = 1
+    p = Fraction(1, sides)
+    q = Fraction(min(low, sides), sides)
+    #a high face can turn up on any roll; a low one only if every roll was
+    #low and the last gave up
+    high = p * sum(q ** n for n in xrange(waves+1))
+    return [p * q ** waves if face <= low else high
+            for face in xrange(1, sides+1)]
+
+def _add(left, right):
+    '''Returns the distribution of the sum of two independent
+    distributions, each {value: P}.'''
+    ret = {}
+    for a, pa in left.iteritems():
+        for b, pb in right.iteritems():
+            ret[a+b] = ret.get(a+b, 0) + pa*pb
+    return ret
+
+def exploding(sides, high, value=None, faces=None, waves=dice.MAX_WAVES):
+    '''Returns the exact odds of what one die of {sides} sides adds up to,
+    {total: P}, when it explodes on {high} or more for up to {waves} waves.
+    {value}(face) is what each face adds (default the face itself, or
+    e.g. 1 for a success and 0 otherwise), and {faces} the odds of each
+    face of the first die (default a fair die; see rerolled()); the extra
+    dice are always fair. Exact for pools too small to reach
+    dice.MAX_EXTRA extra dice.'''
+    if value is None: value = lambda face: face
+    fair = [Fraction(1, sides)] * sides
+    #an extra die that can still explode {k} more times, starting at none
+    chain = {}
+    for face in xrange(1, sides+1):
+        chain[value(face)] = chain.get(value(face), 0) + fair[face-1]
+    for _ in xrange(waves-1):
+        after = {}
+        for face in xrange(1, sides+1):
+            if face >= high:
+                part = _add({value(face): fair[face-1]}, chain)
+            else:
+                part = {value(face): fair[face-1]}
+            for total, p in part.iteritems():
+                after[total] = after.get(total, 0) + p
+        chain = after
+    ret = {}
+    for face, p in enumerate(faces or fair, 1):
+        if face >= high and waves:
+            part = _add({value(face): p}, chain)
+        else:
+            part = {value(face): p}
+        for total, q in part.iteritems():
+            ret[total] = ret.get(total, 0) + q
+    return ret
+
+def pool(count, die):
+    '''Returns the exact odds of the total of {count} independent dice,
+    each distributed as {die} ({value: P}), as {total: P}.'''
+    ret = {0: Fraction(1)}
+    #square and multiply, so big pools take log2(count) convolutions
+    while count:
+        if count & 1:
+            ret = _add(ret, die)
+        count >>= 1
+        if count:
+            die = _add(die, die)
+    return ret
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,237 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""One-Roll Engine: a pool of d10s read for sets of matching faces, each
+set being {width} dice showing {height}. Wiggle dice aren't rolled; they're
+set to whatever faces make the best sets once the rest have been."""
+
+import threading
+from collections import namedtuple, OrderedDict
+
+import dice
+import formatting
+
+NAME = "ore"
+#most dice in a pool
+MAX_POOL = 10
+#most wiggle dice a roll can have
+MAX_WIGGLE = 4
+#what a wiggle die can be set to make best: the widest set, the highest
+#set, or the most sets
+GOALS = ("wide", "high", "sets")
+#best() answers remembered, keyed by histogram
+CACHE_SIZE = 1024
+
+Set = namedtuple('Set', 'width height')
+#sets low height first, the faces of dice in no set, and the faces any
+#wiggle dice were set to
+Result = namedtuple('Result', 'sets loose wiggled')
+
+def check(pool, called=None, expert=None, wiggle=None):
+    '''Validates a roll of {pool} dice plus an optional called and expert
+    die and {wiggle} wiggle dice, returning its params.'''
+    if not 1 <= pool <= MAX_POOL:
+        raise ValueError("You must roll between 1 and %s dice."%MAX_POOL)
+    if called and not 1 <= called <= 10:
+        raise ValueError("They're d10s, you idiot. You can't call a side that doesn't exist.")
+    if expert and not 1 <= expert <= 10:
+        raise ValueError("They're d10s, you idiot. You can't set a side that doesn't exist.")
+    if wiggle and not 0 <= wiggle <= MAX_WIGGLE:
+        raise ValueError("You can have at most %s wiggle dice."%MAX_WIGGLE)
+    return (pool, called or None, expert or None, wiggle or None)
+
+def roll(params, rng=None):
+    '''Rolls the pool and adds the called and expert dice to it, returning
+    the histogram. Wiggle dice are left for evaluate().'''
+    pool, called, expert, wiggle = params
+    counts = dice.rollCounts(10, pool, rng)
+    if called: counts[called-1] += 1
+    if expert: counts[expert-1] += 1
+    return counts
+
+def matches(counts):
+    '''Returns the ORE sets in the histogram {counts} as (width, height)
+    pairs, low height first.'''
+    return [Set(width, face) for face, width in enumerate(counts, 1)
+            if width > 1]
+
+def widest(counts):
+    '''Returns the (width, height) of the widest ORE set in {counts}, the
+    highest one on a tie, or (0, 0) if nothing matched.'''
+    best = (0, 0)
+    for face, width in enumerate(counts, 1):
+        if width > 1 and width >= best[0]:
+            best = (width, face)
+    return best
+
+def resolve(counts, wiggled=()):
+    '''Reads the histogram {counts} into a Result: its sets, low height
+    first, and its loose dice.'''
+    sets = []
+    loose = []
+    for face, width in enumerate(counts, 1):
+        if width > 1:
+            sets.append(Set(width, face))
+        elif width:
+            loose.append(face)
+    return Result(sets, tuple(loose), tuple(wiggled))
+
+def _rank(counts, goal):
+    '''Returns how good the histogram {counts} is for {goal}, as
+    something that sorts higher the better it is.'''
+    sets = [(width, face) for face, width in enumerate(counts, 1)
+            if width > 1]
+    if not sets:
+        return (0, 0, 0)
+    if goal == "high":
+        height, width = max((face, width) for width, face in sets)
+        return (height, width, len(sets))
+    width, height = max(sets)
+    if goal == "sets":
+        return (len(sets), width, height)
+    return (width, height, len(sets))
+
+def _search(counts, wiggles, goal, memo):
+    '''Returns (rank, faces) of the best way to set {wiggles} more dice
+    on the histogram tuple {counts}, remembering answers in {memo}.'''
+    if not wiggles:
+        return _rank(counts, goal), ()
+    key = (counts, wiggles)
+    try:
+        return memo[key]
+    except KeyError:
+        pass
+    #a wiggle die is only worth adding to a face already showing, or to the
+    #highest face not showing, which beats starting a set on any lower one
+    faces = [face for face, n in enumerate(counts, 1) if n]
+    fresh = [face for face, n in enumerate(counts, 1) if not n]
+    if fresh:
+        faces.append(fresh[-1])
+    best = None
+    for face in faces:
+        after = counts[:face-1] + (counts[face-1]+1,) + counts[face:]
+        rank, rest = _search(after, wiggles-1, goal, memo)
+        if best is None or rank > best[0]:
+            best = (rank, (face,) + rest)
+    memo[key] = best
+    return best
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def best(counts, wiggles, goal="wide"):
+    '''Works out what to set {wiggles} wiggle dice to, added to the
+    histogram {counts}, to make the best sets for {goal} (one of GOALS).
+    Returns (faces, histogram with them added), faces low to high.'''
+    if goal not in GOALS:
+        raise ValueError("Wiggle dice can go for %s."%', '.join(GOALS))
+    key = (tuple(counts), wiggles, goal)
+    _lock.acquire()
+    try:
+        faces = _cache.pop(key, None)
+        if faces is not None:
+            _cache[key] = faces
+    finally:
+        _lock.release()
+    if faces is None:
+        faces = tuple(sorted(_search(key[0], wiggles, goal, {})[1]))
+        _lock.acquire()
+        try:
+            _cache[key] = faces
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        finally:
+            _lock.release()
+    after = list(counts)
+    for face in faces:
+        after[face-1] += 1
+    return faces, after
+
+def evaluate(params, counts):
+    '''Sets any wiggle dice to make the widest sets, then reads the
+    histogram {counts} into a Result.'''
+    wiggle = params[3]
+    if not wiggle:
+        return resolve(counts)
+    faces, counts = best(counts, wiggle)
+    return resolve(counts, faces)
+
+def score(result):
+    '''Returns the number a result adds to a dice expression.'''
+    return len(result.sets)
+
+def verdict(result):
+    '''Returns what the roll did, as counted by a tally of rolls.'''
+    return "matched" if result.sets else "didn't match"
+
+def logEntry(params, counts, result):
+    '''Returns the roll as (args, outcome, success, dice) for the roll
+    log. Wiggle dice are logged among the dice, but not as an argument.'''
+    pool, called, expert, wiggle = params
+    return (pool, called or 0, expert or 0), len(result.sets), \
+           bool(result.sets), sorted(dice.expand(counts) +
+                                     list(result.wiggled))
+
+def _sets(result, style):
+    return ", ".join([style["ore.set"]%match for match in result.sets])
+
+def describe(params, counts, result):
+    '''Returns the roll as one term of a dice expression.'''
+    style = formatting.style()
+    #unused params in the middle are written as 0, as they'd be typed
+    args = list(params)
+    while not args[-1]:
+        args.pop()
+    args = ','.join(str(x or 0) for x in args)
+    rolled = style.counts(counts)
+    if result.wiggled:
+        rolled += " wiggled %s"%style.faces(result.wiggled)
+    return "%s(%s) [%s] %s"%(NAME, args, rolled,
+                             _sets(result, style) or "no matches")
+
+def format(params, counts, result, nick=None, note=None, style=None):
+    '''Returns the ore command's (reply, action), worded in {style} (a
+    formatting.Style, verbose by default).'''
+    if style is None: style = formatting.style()
+    pool, called, expert, wiggle = params
+    text = [note] if note else []
+    if called: text.append(style["ore.called"]%called)
+    if expert: text.append(style["ore.expert"]%expert)
+    if wiggle: text.append(style["ore.wiggle"]%
+                           formatting.faces(result.wiggled, "+"))
+    return style["ore.roll"]%(_sets(result, style) or style["ore.none"],
+                              style.counts(counts),
+                              style["ore.extra"]%", ".join(text)
+                              if text else ""), False
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,128 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Old World of Darkness: a pool of d10s, each die at or over the
+difficulty is a success, and no successes with a 1 showing is a botch."""
+
+from collections import namedtuple
+
+import dice
+import formatting
+
+NAME = "owod"
+#most dice in a pool
+MAX_POOL = 20
+
+Result = namedtuple('Result', 'successes botch')
+
+def check(pool, diff=None):
+    '''Validates a roll of {pool} dice at {diff}, returning its params.'''
+    if not 1 <= pool <= MAX_POOL:
+        raise ValueError("You must roll between 1 and %s dice."%MAX_POOL)
+    if not diff: diff = 6
+    return (pool, diff)
+
+def roll(params, rng=None):
+    '''Rolls the pool, returning its histogram, or None if the difficulty
+    settles it without rolling.'''
+    pool, diff = params
+    if diff == 1 or diff > 10:
+        return None
+    return dice.rollCounts(10, pool, rng)
+
+def successes(counts, diff):
+    '''Returns how many dice in the histogram {counts} are >= {diff}.'''
+    #faces {diff} through 10 live in slots {diff-1} onward
+    return sum(counts[max(diff, 1)-1:])
+
+def evaluate(params, counts):
+    '''Scores the histogram {counts}.'''
+    pool, diff = params
+    if counts is None:
+        #difficulty 1 can't fail, and over 10 can't succeed
+        return Result(pool if diff == 1 else 0, False)
+    hits = successes(counts, diff)
+    return Result(hits, not hits and bool(counts[0]))
+
+def score(result):
+    '''Returns the number a result adds to a dice expression.'''
+    return result.successes
+
+def verdict(result):
+    '''Returns what the roll did, as counted by a tally of rolls.'''
+    if result.successes:
+        return "succeeded"
+    return "botched" if result.botch else "failed"
+
+def logEntry(params, counts, result):
+    '''Returns the roll as (args, outcome, success, dice) for the roll
+    log. Difficulties past what a d10 can show are logged as 0 or 11, so
+    they fit the log's fields.'''
+    pool, diff = params
+    return (pool, max(0, min(11, diff))), result.successes, \
+           result.successes > 0, dice.expand(counts or ())
+
+def _outcome(result, style):
+    if result.successes == 1:
+        return style["owod.success"]
+    elif result.successes > 1:
+        return style["owod.successes"]%result.successes
+    elif result.botch:
+        return style["owod.botch"]
+    return style["owod.failure"]
+
+def describe(params, counts, result):
+    '''Returns the roll as one term of a dice expression.'''
+    style = formatting.style()
+    return "%s(%s,%s) [%s] %s"%(NAME, params[0], params[1],
+                                style.counts(counts or ()),
+                                _outcome(result, style))
+
+def format(params, counts, result, nick=None, note=None, style=None):
+    '''Returns the owod command's (reply, action), worded in {style} (a
+    formatting.Style, verbose by default).'''
+    ##(user) rolls (rolls) to (note). (N successes|failure|botch!)
+    ##Luna rolls 1,2,3,4,7,8 to summon evil things. (2 successes)
+    ##Luna rolls 1,3,3 to pick the lock. (botch!)
+    if style is None: style = formatting.style()
+    pool, diff = params
+    if diff == 1:
+        times = style["owod.times"]%pool if pool > 1 else ""
+        return style["owod.auto"]%times, False
+    elif diff > 10:
+        return style["owod.tooHigh"], False
+    return style["owod.roll"]%(style.counts(counts),
+                               style["owod.note"]%note if note else "",
+                               _outcome(result, style)), style.action
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
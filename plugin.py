@@ -30,168 +30,241 @@
 
 ###
 
+import supybot.conf as conf
 import supybot.utils as utils
-from supybot.commands import *
-import supybot.plugins as plugins
+from supybot.commands import wrap, optional, many
 import supybot.ircutils as ircutils
 import supybot.callbacks as callbacks
-from random import randint
-from itertools import repeat
-import re,string
+import supybot.ircmsgs as ircmsgs
+import supybot.schedule as schedule
+import json
+import time
+import struct
+
+#odds, simulate, rolllog and macros are imported when first needed, so
+#loading the plugin stays quick
+import core
+import dice
+import formatting
+import limits
+import rngs
+import stats
+import systems
+import workers
 
 class RPGDice(callbacks.Plugin):
     """A plugin that rolls various dice sets for pen-and-pad roleplaying
     games. Has three commands: 'ore' for one-roll engine, 'owod' for old
     World of Darkness, and 'dh' for Dark Heresy."""
 
+    def __init__(self, irc):
+        self.__parent = super(RPGDice, self)
+        self.__parent.__init__(irc)
+        #heavy commands run here instead of on the bot's main thread
+        self.workers = workers.WorkerPool(
+            self.registryValue('workerThreads'),
+            self.registryValue('workerQueueSize'))
+        #opened on the first roll that needs logging
+        self.rollLog = None
+        #likewise, on the first use of a macro
+        self.macroStore = None
+        self.limiter = limits.Limiter()
+        self.coalescer = limits.Coalescer()
+
+    def die(self):
+        self.workers.stop()
+        core.shutdown()
+        if self.rollLog is not None:
+            self.rollLog.close()
+        if self.macroStore is not None:
+            self.macroStore.close()
+        self.__parent.die()
+
     ####
     ## Some utility functions
     ####
     def rollDice(self, sides, num):
-        '''Rolls {num} dice of {sides} sides.'''
-        #make sure we need to roll multiple dice
-        if num>1:
-            #initialize the list that will hold the rolled dice
-            ret=[]
-            #iterate without bothering to hold the iterator's current value
-            for _ in repeat(None, num):
-                #roll the die
-                x = randint(1,sides)
-                #add the die to the list
-                ret+=[x]
-            #sort the list from low to high, prettier
-            ret.sort() # in-place
-        #roll just one die
-        else:
-            #roll the die
-            ret = [randint(1,sides),]
-        return ret
-
-    def insert(self, src, new, pos):
-        '''Inserts new inside src at pos.'''
-        return src[:pos] + new + src[pos:]
-
-    def optTxt(self,num,pre="",post=""):
-        '''Returns a number if it exists, with optional pre- and post- text
-        formatting.'''
-        txt=""
-        if num:
-            if pre: txt+="%s"%pre
-            txt+="%s"%num
-            if post: txt+="%s"%post
-        return txt
+        '''Rolls {num} dice of {sides} sides, sorted low to high.'''
+        return dice.expand(dice.rollCounts(sides, num))
 
     def sRep(self,arr):
         '''Returns the list or tuple as a comma delimited string.'''
-        return ', '.join(str(x) for x in arr)
+        return formatting.faces(arr)
+
+    def pct(self,prob):
+        '''Returns the probability {prob} as a percentage string.'''
+        return core.pct(prob)
+
+    def runOnWorkers(self,irc,func,args,done,key=None):
+        '''Runs func(*args) on the worker pool and calls done with what it
+        returns. A ValueError it raises is shown to the user as is. With a
+        {key}, identical requests made while it's running share its result.'''
+        def failed(e):
+            if isinstance(e, workers.TimedOut):
+                irc.error("That took too long, so I gave up on it.")
+            elif isinstance(e, ValueError):
+                irc.error(str(e))
+            else:
+                self.log.error('%s failed: %s', func.__name__, e)
+                irc.error("Something went wrong working that out.")
+        def start(done,failed):
+            self.workers.submit(func, args, done=done, failed=failed,
+                                timeout=self.registryValue('workerTimeout'))
+        try:
+            if key is None:
+                start(done,failed)
+            else:
+                self.coalescer.submit(key, start, done, failed)
+        except workers.QueueFull:
+            irc.error("I'm busy rolling for other people, try again in a "
+                      "moment.")
+
+    def offload(self,irc,func,*args):
+        '''Runs func(*args) on the worker pool and replies with the string
+        it returns, sharing the reply among identical requests.'''
+        self.runOnWorkers(irc,func,args,irc.reply,(func.__name__,)+args)
+
+    def checkRate(self,irc,msg):
+        '''Takes a token from the rate limits of {msg}'s sender and
+        channel. Returns False, and tells the sender the first time, if
+        either has run out.'''
+        channel=msg.args[0]
+        keys=[(('nick',msg.nick),self.registryValue('nickRollsPerMinute'),
+               self.registryValue('nickRollBurst'))]
+        if ircutils.isChannel(channel):
+            keys.append((('channel',channel),
+                self.registryValue('channelRollsPerMinute',channel),
+                self.registryValue('channelRollBurst',channel)))
+        refused=self.limiter.take(keys)
+        if refused is None:
+            return True
+        (kind,who),first=refused
+        #only complain once per run dry, so spam gets no replies to queue
+        if not first:
+            irc.noReply()
+        elif kind=='nick':
+            irc.error("You're rolling too fast, slow down a little.")
+        else:
+            irc.error("%s is rolling too fast, slow down a little."%who)
+        return False
+
+    def getRng(self,msg):
+        '''Returns the random number generator for where {msg} was sent.'''
+        channel=msg.args[0]
+        if not ircutils.isChannel(channel): channel=None
+        backend=self.registryValue('rngBackend',channel)
+        seed=self.registryValue('rngSeed',channel)
+        try:
+            return rngs.get(channel,backend,seed)
+        except (ImportError, AttributeError) as e:
+            #numpy missing, or one without the API the backend needs
+            self.log.warning('Can\'t use the %s backend (%s), using random.',
+                             backend,e)
+            return rngs.get(channel,'random',seed)
+
+    def getStyle(self,msg):
+        '''Returns the reply style for where {msg} was sent.'''
+        channel=msg.args[0]
+        if not ircutils.isChannel(channel): channel=None
+        return formatting.style(self.registryValue('replyStyle',channel),
+                                self.registryValue('replyLocale',channel))
+
+    def getRollLog(self):
+        '''Returns the roll log, opening it if need be.'''
+        if self.rollLog is None:
+            import rolllog
+            filename=conf.supybot.directories.data.dirize('RPGDice.rolls')
+            self.rollLog=rolllog.RollLog(filename)
+        return self.rollLog
+
+    def getMacros(self):
+        '''Returns the macro store, opening it if need be.'''
+        if self.macroStore is None:
+            import macros
+            filename=conf.supybot.directories.data.dirize('RPGDice.macros.db')
+            self.macroStore=macros.MacroStore(filename)
+        return self.macroStore
+
+    def logRoll(self,msg,name,system,params,raw,result):
+        '''Adds a roll to the roll log, if it's on.'''
+        channel=msg.args[0]
+        if not ircutils.isChannel(channel): channel=None
+        if not self.registryValue('rollLog',channel):
+            return
+        args,outcome,success,rolled=system.logEntry(params,raw,result)
+        try:
+            #one history per nick, however its owner capitalises it
+            self.getRollLog().append(channel,ircutils.toLower(msg.nick),name,
+                system.verdict(result),args,outcome,success,rolled)
+        except (EnvironmentError, struct.error) as e:
+            self.log.error('Couldn\'t log a roll: %s', e)
+
+    def rollSystem(self,irc,msg,name,args,note=None):
+        '''Runs the system {name}'s check, roll, evaluate and format stages
+        on {args} and replies with the result.'''
+        if not self.checkRate(irc,msg):
+            return
+        timer=stats.timer(name,self.registryValue('stats'))
+        system=systems.get(name)
+        try:
+            params=system.check(*args)
+        except ValueError as e:
+            irc.error(str(e))
+            return
+        timer.lap('parse')
+        self.rollChecked(irc,msg,name,system,params,note,timer)
+
+    def rollChecked(self,irc,msg,name,system,params,note,timer):
+        '''Runs the roll, evaluate and format stages on {params} that
+        {system}'s check has already passed, and replies with the result.'''
+        rolled=core.rollChecked(name,params,self.getRng(msg),msg.nick,note,
+                                self.getStyle(msg),timer)
+        irc.reply(rolled.reply,action=rolled.action)
+        timer.lap('reply')
+        self.logRoll(msg,name,system,params,rolled.raw,rolled.result)
+        timer.lap('log')
+        timer.done()
 
     ####
     ## Engine-specific functions
     ####
     #one-roll engine helper function(s)
-    def matchORE(self, arr):
-        '''Finds and returns the number of ORE-style matches in {arr}.'''
-        #initialize our string
-        ret=""
-        #check matches for each number 1-10
-        for x in xrange(1,11):
-            #count how many times {x} is found
-            y = arr.count(x)
-            #if {x} is found more than once...
-            if arr.count(x)>1:
-                #add how many times we found {x} to our list formatted
-                ret+="%sx%s, "%(y,x)
-        #trim off the trailing comma
-        if ret: ret=ret[0:-2]
-        return ret
+    def matchORE(self, counts):
+        '''Finds and returns the ORE-style matches in the histogram
+        {counts}.'''
+        return ', '.join("%sx%s"%match
+                         for match in systems.get('ore').matches(counts))
 
     #old world of darkness helper function(s)
-    def matchOWOD(self,arr,diff):
-        '''Finds and returns the number of times a die >= {diff} is found
-        in {arr}.'''
-        #initialize our counter
-        y=0
-        #if there's only one number, rather than a list...
-        if type(arr) is int:
-            #...then we just need to check if that one is a hit.
-            if arr >= diff: return 1
-            else: return 0
-        #check each die side from our difficulty to a max of 10
-        for x in xrange(diff,11):
-            #if we found at least one match...
-            if arr.count(x):
-                #...add how many times we found that die side
-                y+=arr.count(x)
-        return y
+    def matchOWOD(self,counts,diff):
+        '''Finds and returns the number of dice >= {diff} in the histogram
+        {counts}.'''
+        return systems.get('owod').successes(counts,diff)
 
     #dark heresy helper function(s)
     def matchDH(self,roll):
         '''Matches percentile rolls to their corresponding hit box, and
         returns the box that was hit.'''
-        #reverse the number rolled as a string,
-        #then force it back to int
-        hit=int(str(roll)[::-1])
-        #find where the hit landed
-        if hit <= 10:
-            return "Head"
-        elif hit <= 20:
-            return "Right Arm"
-        elif hit <=30:
-            return "Left Arm"
-        elif hit <=70:
-            return "Body"
-        elif hit <=85:
-            return "Right Leg"
-        elif hit <=100:
-            return "Left Leg"
+        return systems.get('dh').location(roll)
 
     def nextHit(self,hit,deg):
         '''Calculates where additional hits past the second land according
         to the official hit table.'''
-        #initialize our string to return
-        hits=""
-        #how many hits to calculate
-        #degrees minus the two already determined.
-        calcs=deg-2
-
-        #hit tables
-        if "Head" in hit: hitList=("Arm","Body","Arm","Body")
-        elif "Arm" in hit: hitList=("Body","Head","Body","Arm")
-        elif "Body" in hit: hitList=("Arm","Head","Arm","Body")
-        elif "Leg" in hit: hitList=("Body","Arm","Head","Body")
-
-        #calculate each hit, but use indicies for our hitlists.
-        #calcs will be at least 0, so need to add 1
-        for x in xrange(0,calcs+1):
-            #third, fourth, fifth hits as indicies.
-            if x < 3:
-                hits+=", %s"%hitList[x]
-            #sixth hit, no further hits
-            elif x==calcs==3:
-                hits+=", %s"%hitList[3]
-            #sixth hit, more hits.
-            else:
-                #calc as fourth hit in table, index 3
-                hits+=", %sx%s"%(hitList[3],calcs-2)
-                #break so further hits aren't calculated.
-                break
-        return hits
+        dh=systems.get('dh')
+        hits=dh.followUps(dh.LOCATIONS.index(hit),deg)
+        return ''.join(", %s"%dh.formatHits([hit]) for hit in hits)
 
     def isValidKind(self,kind):
         '''Checks to see if {str} is a valid attack kind.'''
-        if self.isValidRanged(kind) or self.isValidMelee(kind):
-            return True
-        else: return False
+        return systems.get('dh').isValidKind(kind)
 
     def isValidRanged(self,kind):
         '''Checks to see if {kind} is a valid ranged attack kind.'''
-        rangedList=("auto","semi")
-        return kind in rangedList
+        return systems.get('dh').isValidRanged(kind)
 
     def isValidMelee(self,kind):
         '''Checks to see if {kind} is a valid melee attack kind.'''
-        meleeList=()
-        return kind in meleeList
+        return systems.get('dh').isValidMelee(kind)
 
     ####
     ## Commands
@@ -214,68 +287,7 @@ class RPGDice(callbacks.Plugin):
             else:
                 note=rest
 
-        ##TODO: error checking will go here
-        if test > 300 or test < 1:
-            irc.error("You must roll a difficulty between 1 and 300")
-            return
-
-        #roll against a d%
-        roll=self.rollDice(100,1)[0]
-        #initialize our reply string
-        reply=""
-
-        #first we check if the attack was ranged,
-        #and if so whether or not the weapon jams.
-        if roll >= 96 and self.isValidRanged(kind):
-            reply="your weapon jams! (reroll if using unjammable weapon)"
-        #check if the roll was a critfail.
-        elif roll == 100:
-            reply="a critical failure!"
-        #finally we check if the roll was successful (roll<=test)
-        elif roll <= test:
-            #calculate degrees of success
-            degrees=(test-roll)/10
-            #add formatted success message to our reply string
-            reply+="a success%s!"%self.optTxt(degrees,pre=" by ",post="°")
-        #if we didn't succeed, jam, or critfail then we were unsuccessful
-        else:
-            #calculate degrees of success
-            degrees=(roll-test)/10
-            #add formatted failure message to our reply string
-            reply+="unsuccessful%s."%self.optTxt(degrees,pre=" by ",post="°")
-        #add the actual roll to our reply.
-        reply+=" [%s]"%roll
-
-        #check if an attack kind was specified and valid
-        if kind:
-            #make sure the combat hit was successful
-            if "unsuccess" not in reply:
-                #change reply to reflect combat mode
-                reply=self.insert(reply,"ful hit",9)
-                #ranged weapon firing mode
-                if kind=="auto" or kind=="semi":
-                    #in semi mode, need two degrees per extra hit
-                    if kind=="semi": degrees=degrees/2
-                    #{hits} holds our hit location string
-                    #{first} holds the primary target determined by roll
-                    first=hits=self.matchDH(roll)
-                    #if we have any degrees, determine additional hits
-                    if degrees:
-                        if degrees>1:
-                            #second hit always matches the first.
-                            hits+=", %s"%hits
-                        #third hit onward is determined with nextHit()
-                        if degrees>2:
-                            #we will pass the first hit and the number of
-                            #degrees to calculate. this number will be 2+
-                            hits+=self.nextHit(first,degrees)
-                    #add the hits to our reply string
-                    reply+=" (%s)"%hits
-
-        #if there is a note, we will add it here
-        if note: reply+=" (%s)"%note
-        #send the finalized reply
-        irc.reply("%s: %s"%(msg.nick,reply))
+        self.rollSystem(irc,msg,'dh',(test,kind),note)
     dh = wrap(dh, ['int',
                     optional('text')
                 ])
@@ -286,78 +298,316 @@ class RPGDice(callbacks.Plugin):
         """ <number of dice> [<difficulty=6>] [<note>]
         -- Rolls d10's and returns the results, and whether or not the roll
          was successful. Can add a note optionally after your dice."""
-        ##(user) rolls (rolls) to (note). (N successes|failure|botch!)
-        ##Luna rolls 1,2,3,4,7,8 to summon evil things. (2 successes)
-        ##Luna rolls 1,3,3 to pick the lock. (botch!)
-
-        #start with error checking.
-        if pool > 20 or pool < 1:
-            irc.error("You must roll between 1 and 20 dice.")
-        else:
-            if diff == 1:
-                if pool > 1: times=pool
-                else: times=""
-                reply="Somehow, against all odds, in a true show of epic talent, you manage to succeed%s."%self.optTxt(times," "," times")
-                action=False
-            elif diff > 10:
-                reply="You fail. Probably because you're too stupid to even know how many sides a d10 has."
-                action=False
-            else:
-                #error checking complete, time to make the roll.
-                rolls = self.rollDice(10,pool)
-                if not diff: diff=6
-                match = self.matchOWOD(rolls,diff)
-                if match == 1:
-                    result="1 success"
-                elif match > 1:
-                    result="%s successes"%match
-                elif not match and 1 in rolls:
-                    result="botch!"
-                else:
-                    result="failure"
-                reply="rolls %s"%self.sRep(rolls)
-                if note:
-                    reply+=" to %s."%note
-                reply+=" (%s)"%result
-                action=True
-            irc.reply(reply, action=action)
+        self.rollSystem(irc,msg,'owod',(pool,diff),note)
     owod = wrap(owod, ['int',
                         optional('int'),
                         optional('text')
                     ])
 
-    def ore(self,irc,msg,args,num,call,expert,text):
-        """ <number of dice> [<called>] [<expert>] [<note>]
+    def ore(self,irc,msg,args,num,call,expert,wiggle,text):
+        """ <number of dice> [<called>] [<expert>] [<wiggle dice>] [<note>]
         --  Rolls d10's and returns the results, including any pairs.
-        Can add a note optionally after your dice. """
-        if (num > 10) or (num < 1):
-            irc.error("You must roll between 1 and 10 dice.")
-        else:
-            if not text: text=""
-            arr=self.rollDice(10,num)
-            ##parse text for calls and/or expert dice.
-            #first look for exactly one call
-            if text and call: text+=", "
-            if call:
-                if 10 < call > 1:
-                    irc.error("They're d10s, you idiot. You can't call a side that doesn't exist.")
-                    return
-                else:
-                    arr+=[call]
-                    text+="called:%s"%call
-            if text and expert: text+=", "
-            if expert: arr+=[expert];text+="expert:%s"%expert
-            match=self.matchORE(arr)
-            reply="%s: %s"%(match,str(arr))
-            if text:
-                reply+=" (%s)"%text
-            irc.reply(reply)
+        Wiggle dice are set to make the widest set they can. Can add a
+        note optionally after your dice. """
+        self.rollSystem(irc,msg,'ore',(num,call,expert,wiggle),text)
     ore = wrap(ore, ['int',
+                     optional('int'),
                      optional('int'),
                      optional('int'),
                      optional('text')
                     ])
 
+    # wiggle
+    def wiggle(self,irc,msg,args,wiggles,faces,goal):
+        """ <wiggle dice> <die> [<die> ...] [wide|high|sets]
+        -- Works out what to set your ORE wiggle dice to, given the dice
+        you rolled, to make the widest set (the default), the highest set
+        or the most sets."""
+        try:
+            irc.reply(core.wiggleReport(wiggles,faces,goal))
+        except ValueError as e:
+            irc.error(str(e))
+    wiggle = wrap(wiggle, ['positiveInt',
+                           many('int'),
+                           optional(('literal', ('wide','high','sets')))
+                          ])
+
+    ## Dice expressions
+    # roll
+    def roll(self,irc,msg,args,text):
+        """ <expression>
+        -- Rolls a dice expression such as 4d6kh3+2, 10d10>=7! or 3d20r1.
+        Dice take rN (reroll N or less once), ![N] (explode), khN/klN
+        (keep highest/lowest) and >=N, >N, <=N, <N, =N (count successes).
+        owod(<dice>[,<diff>]), ore(<dice>[,<called>[,<expert>[,<wiggle>]]])
+        and dh(<test>[,<kind>]) roll by those systems' rules."""
+        if not self.checkRate(irc,msg):
+            return
+        timer=stats.timer('roll',self.registryValue('stats'))
+        try:
+            total,terms,reply=core.rollExpression(text,self.getRng(msg),
+                                                  msg.nick,timer)
+        except ValueError as e:
+            irc.error(str(e))
+            return
+        irc.reply(reply)
+        timer.lap('reply')
+        timer.done()
+    roll = wrap(roll, ['text'])
+
+    ## Bulk rolls
+    # rolls
+    def rolls(self,irc,msg,args,count,system,rest):
+        """ <count> <owod|ore|dh|expression> [<arguments>]
+        -- Makes the same roll <count> times, e.g. 'rolls 50 owod 8 6' or
+        'rolls 6 4d6kh3'. Replies with a summary, followed by the rolls
+        a line at a time, up to a limit."""
+        limit=self.registryValue('maxBulkRolls')
+        if count > limit:
+            irc.error("You can make at most %s rolls at once."%limit)
+            return
+        text=core.bulkText(system,rest)
+        if not self.checkRate(irc,msg):
+            return
+        timer=stats.timer('rolls',self.registryValue('stats'))
+        #pace the detail so a big batch doesn't trip flood protection
+        target=msg.args[0]
+        if not ircutils.isChannel(target):
+            target=msg.nick
+        delay=self.registryValue('bulkDelay')
+        def done(result):
+            summary,lines=result
+            irc.reply(summary)
+            now=time.time()
+            for x,line in enumerate(lines):
+                schedule.addEvent(lambda line=line:
+                    irc.queueMsg(ircmsgs.privmsg(target,line)),
+                    now+delay*(x+1))
+            timer.lap('reply')
+            timer.done()
+        #every batch rolls fresh dice, so batches are never shared
+        self.runOnWorkers(irc,core.bulkRolls,(text,count,self.getRng(msg),
+            self.registryValue('bulkLineLength'),timer,
+            self.registryValue('maxBulkLines')),done)
+    rolls = wrap(rolls, ['positiveInt',
+                         'something',
+                         optional('text')
+                        ])
+
+    ## Macros
+    # save
+    def save(self,irc,msg,args,name,system,rest):
+        """ <name> <owod|ore|dh> <arguments> [<note>]
+        -- Saves a roll as <name>, taking the same arguments as its command,
+        so 'r <name>' makes it again, e.g. 'save dodge owod 6 7'."""
+        import macros
+        if len(name) > macros.MAX_NAME:
+            irc.error("Macro names can be at most %s characters."%
+                      macros.MAX_NAME)
+            return
+        try:
+            params,note=macros.parse(system,rest.split())
+        except ValueError as e:
+            irc.error(str(e))
+            return
+        store=self.getMacros()
+        nick=ircutils.toLower(msg.nick)
+        name=name.lower()
+        limit=self.registryValue('maxMacros')
+        if store.get(nick,name) is None and len(store.names(nick)) >= limit:
+            irc.error("You can only save %s macros."%limit)
+            return
+        store.save(nick,name,macros.Macro(system,params,note))
+        irc.replySuccess()
+    save = wrap(save, ['something',
+                       ('literal', ('owod','ore','dh')),
+                       'text'
+                      ])
+
+    # r
+    def r(self,irc,msg,args,name,note):
+        """ <name> [<note>]
+        -- Makes the roll you saved as <name>, optionally with a different
+        note."""
+        if not self.checkRate(irc,msg):
+            return
+        timer=stats.timer('r',self.registryValue('stats'))
+        macro=self.getMacros().get(ircutils.toLower(msg.nick),name.lower())
+        if macro is None:
+            irc.error("You haven't saved a roll called %s."%name)
+            return
+        timer.lap('parse')
+        self.rollChecked(irc,msg,macro.system,systems.get(macro.system),
+                         macro.params,note or macro.note,timer)
+    r = wrap(r, ['something',
+                 optional('text')
+                ])
+
+    # unsave
+    def unsave(self,irc,msg,args,name):
+        """ <name>
+        -- Forgets the roll you saved as <name>."""
+        if self.getMacros().remove(ircutils.toLower(msg.nick),name.lower()):
+            irc.replySuccess()
+        else:
+            irc.error("You haven't saved a roll called %s."%name)
+    unsave = wrap(unsave, ['something'])
+
+    # macros
+    def macros(self,irc,msg,args,nick):
+        """ [<nick>]
+        -- Lists the rolls <nick> (default: you) has saved."""
+        if not nick: nick=msg.nick
+        store=self.getMacros()
+        lower=ircutils.toLower(nick)
+        names=store.names(lower)
+        if not names:
+            irc.reply("%s hasn't saved any rolls."%nick)
+            return
+        irc.reply("%s: %s"%(nick,', '.join("%s (%s %s)"%(name,
+            store.get(lower,name).system,' '.join(str(x) for x in
+            store.get(lower,name).params if x)) for name in names)))
+    macros = wrap(macros, [optional('something')])
+
+    ## Roll log
+    # rollhistory
+    def rollhistory(self,irc,msg,args,channel,count):
+        """ [<channel>] [<count>]
+        -- Shows the last <count> (default 5) rolls made in <channel>,
+        newest first. <channel> is only necessary if the message isn't sent
+        in the channel itself."""
+        limit=self.registryValue('maxRollHistory')
+        if not count: count=5
+        if count > limit:
+            irc.error("I can only show the last %s rolls."%limit)
+            return
+        rolls=self.getRollLog().last(channel,count)
+        if not rolls:
+            irc.reply("I haven't logged any rolls in %s."%channel)
+            return
+        now=time.time()
+        irc.reply(' | '.join("%s %s(%s) [%s] %s, %s ago"%(roll.nick,
+            roll.system,','.join(str(arg) for arg in roll.args if arg),
+            self.sRep(roll.dice),roll.verdict,
+            utils.timeElapsed(max(now-roll.time,1),short=True))
+            for roll in rolls))
+    rollhistory = wrap(rollhistory, ['channel',
+                                     optional('positiveInt')
+                                    ])
+
+    # rollstats
+    def rollstats(self,irc,msg,args,nick):
+        """ [<nick>]
+        -- Shows how many rolls <nick> (default: you) has made and how many
+        succeeded, per system."""
+        if not nick: nick=msg.nick
+        counts=self.getRollLog().stats(ircutils.toLower(nick))
+        if not counts:
+            irc.reply("I haven't logged any rolls by %s."%nick)
+            return
+        rolls=sum(n for n,wins in counts.itervalues())
+        wins=sum(wins for n,wins in counts.itervalues())
+        irc.reply("%s: %s rolls, %s successful (%s)"%(nick,rolls,
+            self.pct(float(wins)/rolls),', '.join("%s %s rolls %s"%(system,
+                n,self.pct(float(w)/n))
+                for system,(n,w) in sorted(counts.iteritems()))))
+    rollstats = wrap(rollstats, [optional('something')])
+
+    ## Instrumentation
+    # dicestats
+    def dicestats(self,irc,msg,args,action):
+        """ [reset|export]
+        -- Shows how long each dice command spends in each of its stages,
+        as mean (99th percentile) microseconds. 'export' writes everything
+        to a JSON file in the data directory; 'reset' starts over."""
+        if action=="reset":
+            stats.reset()
+            irc.replySuccess()
+            return
+        snapshot=stats.snapshot()
+        if action=="export":
+            filename=conf.supybot.directories.data.dirize('RPGDice.stats.json')
+            fd=open(filename,'w')
+            try:
+                json.dump({'time':time.time(),'commands':snapshot},fd,
+                          indent=1,sort_keys=True)
+            finally:
+                fd.close()
+            irc.reply("Wrote dice stats to %s."%filename)
+            return
+        if not snapshot:
+            if self.registryValue('stats'):
+                irc.reply("No dice commands have been timed yet.")
+            else:
+                irc.reply("Stats are off; turn on "
+                          "supybot.plugins.RPGDice.stats to collect them.")
+            return
+        pieces=[]
+        for command,entry in sorted(snapshot.iteritems()):
+            stages=entry['stages']
+            pieces.append("%s: %s calls (%s)"%(command,entry['calls'],
+                ', '.join("%s %.1f (%s)"%(stage,stages[stage]['meanUs'],
+                                          stages[stage]['p99Us'])
+                          for stage in stats.ordered(stages))))
+        irc.reply('; '.join(pieces))
+    dicestats = wrap(dicestats, ['admin',
+                                 optional(('literal', ('reset','export')))
+                                ])
+
+    ## Random number generators
+    # reseed
+    def reseed(self,irc,msg,args,channel):
+        """ [<channel>]
+        -- Starts <channel>'s dice over from its rngSeed, so the rolls made
+        since it was set can be replayed. <channel> is only necessary if
+        the message isn't sent in the channel itself."""
+        rngs.reset(channel)
+        irc.replySuccess()
+    reseed = wrap(reseed, [('checkChannelCapability', 'op')])
+
+    ## Odds
+    # odds
+    def odds(self,irc,msg,args,system,num,opt,kind):
+        """ owod <number of dice> [<difficulty=6>] | ore <number of dice> |
+        dh <test> [<kind>]
+        -- Returns the exact odds of a roll, worked out rather than
+        simulated."""
+        if not self.checkRate(irc,msg):
+            return
+        self.offload(irc,core.oddsReport,system,num,opt,kind)
+
+    odds = wrap(odds, [('literal', ('owod','ore','dh')),
+                       'int',
+                       optional('int'),
+                       optional('something')
+                      ])
+
+    ## Simulation
+    # simulate
+    def simulate(self,irc,msg,args,system,trials,num,opt,kind):
+        """ <owod|ore|dh> <rolls> <dice or test> [<difficulty=6>] [<kind>]
+        -- Rolls the same roll many times over and returns how the results
+        fell out."""
+        limit=self.registryValue('maxSimulationTrials')
+        if not 1 <= trials <= limit:
+            irc.error("You can simulate between 1 and %s rolls."%limit)
+            return
+        try:
+            params=core.check(system,core.simulateArgs(system,num,opt,kind))
+        except ValueError as e:
+            irc.error(str(e))
+            return
+        if not self.checkRate(irc,msg):
+            return
+        self.offload(irc,core.simulateReport,system,trials,params,
+                     self.registryValue('workerTimeout'))
+    simulate = wrap(simulate, [('literal', ('owod','ore','dh')),
+                               'positiveInt',
+                               'int',
+                               optional('int'),
+                               optional('something')
+                              ])
+
 Class = RPGDice
 
 
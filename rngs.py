@@ -0,0 +1,260 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Random number generator backends for RPGDice.
+
+Every backend is a random.Random, so the dice engine can use any of them:
+
+    random      the standard Mersenne Twister
+    urandom     os.urandom, read a block at a time rather than per die
+    pcg         a PCG32 generator, small and seedable
+    numpy       a numpy RandomState, which also rolls whole pools in one
+                call; needs numpy (1.16 is the last release for Python 2)
+
+Each channel gets a generator of its own. When a channel has a seed set,
+its generator starts from that seed, so a disputed roll can be replayed."""
+
+import os
+import random
+import hashlib
+import threading
+from binascii import hexlify
+
+#bytes of os.urandom buffered at a time
+URANDOM_BLOCK = 4096
+#2**-53, for turning 53 random bits into a float in [0, 1)
+_RECIP_BPF = 2.0 ** -53
+_MASK32 = 0xffffffff
+_MASK64 = 0xffffffffffffffff
+
+def _toInt(seed):
+    '''Turns a seed of any kind into a 64 bit int, the same way every time
+    on every machine.'''
+    if isinstance(seed, (int, long)):
+        return seed & _MASK64
+    return int(hashlib.sha256(str(seed)).hexdigest()[:16], 16)
+
+class BufferedSystemRandom(random.Random):
+    """Reads os.urandom a block at a time and hands it out as needed.
+    Like random.SystemRandom, it can't be seeded or replayed."""
+    def __init__(self, block=URANDOM_BLOCK):
+        self.block = block
+        self._buffer = ''
+        self._pos = 0
+        self._lock = threading.Lock()
+        random.Random.__init__(self)
+
+    def seed(self, a=None):
+        self.gauss_next = None
+
+    def _bytes(self, n):
+        '''Returns the next {n} bytes of randomness.'''
+        self._lock.acquire()
+        try:
+            if self._pos + n > len(self._buffer):
+                self._buffer = self._buffer[self._pos:] + \
+                               os.urandom(max(self.block, n))
+                self._pos = 0
+            ret = self._buffer[self._pos:self._pos+n]
+            self._pos += n
+            return ret
+        finally:
+            self._lock.release()
+
+    def getrandbits(self, k):
+        if k <= 0:
+            raise ValueError('number of bits must be greater than zero')
+        size = (k + 7) // 8
+        return int(hexlify(self._bytes(size)), 16) >> (size * 8 - k)
+
+    def random(self):
+        return self.getrandbits(53) * _RECIP_BPF
+
+    def getstate(self):
+        raise NotImplementedError('urandom has no state to save.')
+    setstate = getstate
+
+class PCGRandom(random.Random):
+    """The PCG32 (XSH RR) generator: 64 bits of state, 32 bits out per
+    step. Seeded with an int or string, it always gives the same rolls."""
+    def __init__(self, seed=None, stream=0xda3e39cb94b95bdb):
+        self._stream = stream
+        self._lock = threading.Lock()
+        random.Random.__init__(self, seed)
+
+    def seed(self, a=None):
+        if a is None:
+            a = int(hexlify(os.urandom(8)), 16)
+        a = _toInt(a)
+        self.gauss_next = None
+        self._inc = ((self._stream << 1) | 1) & _MASK64
+        self._state = 0
+        self._next()
+        self._state = (self._state + a) & _MASK64
+        self._next()
+
+    def _next(self):
+        '''Steps the generator, returning 32 random bits.'''
+        old = self._state
+        self._state = (old * 6364136223846793005 + self._inc) & _MASK64
+        shifted = (((old >> 18) ^ old) >> 27) & _MASK32
+        rot = old >> 59
+        return ((shifted >> rot) | (shifted << ((-rot) & 31))) & _MASK32
+
+    def getrandbits(self, k):
+        if k <= 0:
+            raise ValueError('number of bits must be greater than zero')
+        self._lock.acquire()
+        try:
+            ret = 0
+            for _ in xrange((k + 31) // 32):
+                ret = (ret << 32) | self._next()
+        finally:
+            self._lock.release()
+        return ret >> (-k % 32)
+
+    def random(self):
+        return self.getrandbits(53) * _RECIP_BPF
+
+    def getstate(self):
+        return (self._state, self._inc, self.gauss_next)
+
+    def setstate(self, state):
+        self._state, self._inc, self.gauss_next = state
+
+class NumpyRandom(random.Random):
+    """A numpy RandomState. Besides the usual methods it has faces(), which
+    the dice engine uses to roll a whole pool in one call. RandomState is
+    used rather than the newer Generator since numpy's last Python 2
+    release doesn't have Generator."""
+    def __init__(self, seed=None):
+        import numpy
+        if not hasattr(numpy.random, 'RandomState'):
+            raise ImportError("numpy %s has no RandomState"%
+                              numpy.__version__)
+        self._numpy = numpy
+        self._lock = threading.Lock()
+        random.Random.__init__(self, seed)
+
+    def seed(self, a=None):
+        if a is not None:
+            #RandomState takes its seed as 32 bit words
+            a = _toInt(a)
+            a = [a & _MASK32, a >> 32]
+        self.gauss_next = None
+        self._gen = self._numpy.random.RandomState(a)
+
+    def faces(self, sides, num):
+        '''Returns {num} zero-based faces of {sides}-sided dice.'''
+        self._lock.acquire()
+        try:
+            return self._gen.randint(0, sides, num).tolist()
+        finally:
+            self._lock.release()
+
+    def getrandbits(self, k):
+        if k <= 0:
+            raise ValueError('number of bits must be greater than zero')
+        size = (k + 7) // 8
+        self._lock.acquire()
+        try:
+            data = self._gen.bytes(size)
+        finally:
+            self._lock.release()
+        return int(hexlify(data), 16) >> (size * 8 - k)
+
+    def random(self):
+        self._lock.acquire()
+        try:
+            return float(self._gen.random_sample())
+        finally:
+            self._lock.release()
+
+    def getstate(self):
+        return self._gen.get_state()
+
+    def setstate(self, state):
+        self._gen.set_state(state)
+
+def _seeded(cls):
+    '''Wraps a seedable backend so an empty seed means "don't".'''
+    return lambda seed: cls(seed or None)
+
+#{backend name: factory taking a seed}
+BACKENDS = {'random': _seeded(random.Random),
+            'urandom': lambda seed: BufferedSystemRandom(),
+            'pcg': _seeded(PCGRandom),
+            'numpy': _seeded(NumpyRandom)}
+
+#{channel: (backend, seed, generator)}
+_channels = {}
+_lock = threading.Lock()
+
+def make(backend, seed=None):
+    '''Returns a new generator from {backend}, seeded with {seed}.'''
+    try:
+        factory = BACKENDS[backend]
+    except KeyError:
+        raise ValueError("There's no %s random number backend."%backend)
+    return factory(seed)
+
+def get(channel, backend='random', seed=None):
+    '''Returns {channel}'s generator, making a new one when there isn't one
+    yet or its backend or seed have been changed.'''
+    _lock.acquire()
+    try:
+        try:
+            old, oldSeed, generator = _channels[channel]
+            if (old, oldSeed) == (backend, seed):
+                return generator
+        except KeyError:
+            pass
+        generator = make(backend, seed)
+        _channels[channel] = (backend, seed, generator)
+        return generator
+    finally:
+        _lock.release()
+
+def reset(channel=None):
+    '''Forgets {channel}'s generator, or every channel's, so the next roll
+    starts over from the seed.'''
+    _lock.acquire()
+    try:
+        if channel is None:
+            _channels.clear()
+        else:
+            _channels.pop(channel, None)
+    finally:
+        _lock.release()
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,238 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""An append-only log of every roll the bot makes.
+
+Rolls are written as fixed-width binary records, so finding the last few
+rolls in a channel means reading a few records back from the end of the
+file, and per-player stats are one pass over a memory map, done with numpy
+when it's there. Channels, nicks, systems and verdicts are stored as ids
+into a names file kept alongside, one name per line."""
+
+import os
+import mmap
+import time
+import struct
+import threading
+
+import dice
+
+#time, channel, nick, system, verdict, three args, outcome, success, number
+#of dice, the dice themselves, padding
+RECORD = struct.Struct('<5I3hhBB24B2x')
+#most dice a record holds
+MAX_DICE = 24
+#range of the signed shorts args and outcome are stored in
+SHORT_MIN = -32768
+SHORT_MAX = 32767
+
+#numpy's view of a record, built the first time stats() has numpy to hand
+_dtype = None
+
+def _recordType(numpy):
+    '''Returns numpy's dtype for RECORD.'''
+    global _dtype
+    if _dtype is None:
+        _dtype = numpy.dtype([('time', '<u4'), ('channel', '<u4'),
+                              ('nick', '<u4'), ('system', '<u4'),
+                              ('verdict', '<u4'), ('args', '<i2', (3,)),
+                              ('outcome', '<i2'), ('success', 'u1'),
+                              ('count', 'u1'), ('dice', 'u1', (MAX_DICE,)),
+                              ('pad', 'V2')])
+    return _dtype
+
+def _clamp(value):
+    '''Returns {value} pinned between SHORT_MIN and SHORT_MAX.'''
+    return max(SHORT_MIN, min(SHORT_MAX, int(value)))
+
+class Roll(object):
+    """One roll read back out of the log."""
+    __slots__ = ('time', 'channel', 'nick', 'system', 'verdict', 'args',
+                 'outcome', 'success', 'dice')
+
+    def __init__(self, **kwargs):
+        for name, value in kwargs.iteritems():
+            setattr(self, name, value)
+
+class RollLog(object):
+    """The roll log kept in {filename}, with its names in {filename}.names.
+    Safe to share between threads."""
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._names = []
+        self._ids = {}
+        namesFile = filename + '.names'
+        if os.path.exists(namesFile):
+            fd = open(namesFile)
+            try:
+                for line in fd:
+                    self._intern(line.rstrip('\n'))
+            finally:
+                fd.close()
+        self._namesFd = open(namesFile, 'a')
+        self._fd = open(filename, 'ab')
+        #a crash mid-write can leave half a record; drop it
+        size = os.path.getsize(filename)
+        if size % RECORD.size:
+            self._fd.truncate(size - size % RECORD.size)
+
+    def _intern(self, name):
+        self._ids[name] = len(self._names)
+        self._names.append(name)
+        return self._ids[name]
+
+    def nameId(self, name, create=False):
+        '''Returns the id of {name}, adding it when {create} is set, or
+        None if it's never been logged.'''
+        name = name.replace('\n', ' ')
+        try:
+            return self._ids[name]
+        except KeyError:
+            if not create:
+                return None
+        #only called with the lock held
+        self._namesFd.write(name + '\n')
+        self._namesFd.flush()
+        return self._intern(name)
+
+    def append(self, channel, nick, system, verdict, args, outcome, success,
+               dice):
+        '''Logs one roll. {args} is up to three small ints; they and
+        {outcome} are clamped to fit a signed short.'''
+        args = tuple(_clamp(arg) for arg in (tuple(args) + (0, 0, 0))[:3])
+        outcome = _clamp(outcome)
+        dice = list(dice)[:MAX_DICE]
+        count = len(dice)
+        dice += [0] * (MAX_DICE - count)
+        self._lock.acquire()
+        try:
+            record = RECORD.pack(int(time.time()),
+                                 self.nameId(channel or '', True),
+                                 self.nameId(nick, True),
+                                 self.nameId(system, True),
+                                 self.nameId(verdict, True),
+                                 *(args + (outcome, bool(success), count) +
+                                   tuple(dice)))
+            self._fd.write(record)
+            self._fd.flush()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._fd.close()
+            self._namesFd.close()
+        finally:
+            self._lock.release()
+
+    def _map(self):
+        '''Returns a read-only map of every whole record, or None if there
+        aren't any.'''
+        fd = open(self.filename, 'rb')
+        try:
+            size = os.fstat(fd.fileno()).st_size
+            size -= size % RECORD.size
+            if not size:
+                return None
+            return mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+        finally:
+            fd.close()
+
+    def _roll(self, fields):
+        names = self._names
+        count = fields[10]
+        return Roll(time=fields[0], channel=names[fields[1]] or None,
+                    nick=names[fields[2]], system=names[fields[3]],
+                    verdict=names[fields[4]], args=fields[5:8],
+                    outcome=fields[8], success=bool(fields[9]),
+                    dice=list(fields[11:11+count]))
+
+    def last(self, channel, n):
+        '''Returns the last {n} rolls made in {channel}, newest first.
+        Only reads back as far as it has to.'''
+        channelId = self.nameId(channel or '')
+        if channelId is None:
+            return []
+        mapped = self._map()
+        if mapped is None:
+            return []
+        try:
+            ret = []
+            unpack = RECORD.unpack_from
+            offset = len(mapped) - RECORD.size
+            while offset >= 0 and len(ret) < n:
+                #check the channel before unpacking the whole record
+                if struct.unpack_from('<I', mapped, offset+4)[0] == channelId:
+                    ret.append(self._roll(unpack(mapped, offset)))
+                offset -= RECORD.size
+            return ret
+        finally:
+            mapped.close()
+
+    def stats(self, nick):
+        '''Returns {system: (rolls, successes)} for every roll {nick} has
+        made.'''
+        nickId = self.nameId(nick)
+        if nickId is None:
+            return {}
+        mapped = self._map()
+        if mapped is None:
+            return {}
+        numpy = dice.getNumpy()
+        try:
+            if numpy is not None:
+                records = numpy.frombuffer(mapped, dtype=_recordType(numpy))
+                mine = records[records['nick'] == nickId]
+                systems = mine['system']
+                ret = {}
+                for system in numpy.unique(systems):
+                    picked = mine['success'][systems == system]
+                    ret[self._names[system]] = (len(picked),
+                                                int(picked.sum()))
+                del records, mine, systems
+                return ret
+            counts = {}
+            unpack = RECORD.unpack_from
+            for offset in xrange(0, len(mapped), RECORD.size):
+                fields = unpack(mapped, offset)
+                if fields[2] == nickId:
+                    rolls, wins = counts.get(fields[3], (0, 0))
+                    counts[fields[3]] = (rolls + 1, wins + fields[9])
+            return dict((self._names[system], value)
+                        for system, value in counts.iteritems())
+        finally:
+            mapped.close()
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,293 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""A standalone dice server, so programs other than the bot can share one
+warm copy of RPGDice's rules. Run it from the plugin's directory:
+
+    python server.py [-H HOST] [-p PORT] [-t THREADS] [-b BACKEND]
+
+Clients send one JSON object per line and get one back per line for each.
+Requests may be pipelined; every reply carries the "id" of the request it
+answers, since bulk rolls, odds and simulations run on worker threads and
+can finish out of order. Requests are:
+
+    {"op": "roll", "text": "4d6kh3+2"}
+    {"op": "system", "system": "owod", "args": [5, 6], "note": "dodge"}
+    {"op": "rolls", "count": 10, "text": "owod(5,6)"}
+    {"op": "odds", "system": "ore", "num": 6}
+    {"op": "simulate", "system": "dh", "trials": 10000, "num": 45,
+     "kind": "auto"}
+    {"op": "ping"}
+
+Any of them may also give an "id", a "nick" for the reply, a "channel" to
+keep a separate random number generator for, and for "system" a "style"
+(verbose or compact). Replies are {"id": ..., "ok": true, ...} with the
+op's results, or {"id": ..., "ok": false, "error": "..."}.
+
+This is a Python 2 plugin, so the server is built on asyncore and asynchat
+rather than asyncio."""
+
+import sys
+import json
+import Queue
+import socket
+import asyncore
+import asynchat
+from optparse import OptionParser
+
+import core
+import formatting
+import rngs
+import simulate
+import workers
+
+#longest request line we'll buffer, in bytes
+MAX_LINE = 65536
+#how often, in seconds, the loop looks for finished worker jobs
+POLL = 0.05
+
+def _native(value):
+    '''Returns {value}, parsed from JSON, with its text as byte strings
+    like the rest of the plugin uses.'''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [_native(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((_native(k), _native(v)) for k, v in value.iteritems())
+    return value
+
+def _bulkRolls(text, count, rng):
+    '''Runs core.bulkRolls for the rolls op, on a worker.'''
+    summary, lines = core.bulkRolls(text, count, rng)
+    return {'summary': summary, 'lines': lines}
+
+class Connection(asynchat.async_chat):
+    """One client, answering each line it sends."""
+    def __init__(self, sock, server):
+        asynchat.async_chat.__init__(self, sock)
+        self.server = server
+        self.buffer = []
+        self.size = 0
+        self.set_terminator('\n')
+
+    def collect_incoming_data(self, data):
+        self.size += len(data)
+        if self.size > MAX_LINE:
+            self.close_when_done()
+            return
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.buffer).strip()
+        self.buffer = []
+        self.size = 0
+        if line:
+            self.server.handle(self, line)
+
+    def reply(self, response):
+        '''Sends {response} as one line of JSON.'''
+        self.push(json.dumps(response, sort_keys=True) + '\n')
+
+    def handle_close(self):
+        self.close()
+
+class Server(asyncore.dispatcher):
+    """Listens on ({host}, {port}), handing heavy requests to a worker pool
+    of {threads} threads. {limits} caps requests as the plugin's config
+    does: maxBulkRolls, maxSimulationTrials and workerTimeout."""
+    def __init__(self, host, port, threads=2, backend='random',
+                 limits=None):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(16)
+        self.backend = backend
+        self.limits = {'maxBulkRolls': 100, 'maxSimulationTrials': 1000000,
+                       'workerTimeout': 30}
+        self.limits.update(limits or {})
+        self.workers = workers.WorkerPool(threads, threads*4,
+                                          'RPGDice server')
+        #worker threads can't touch the sockets, so they leave replies here
+        self.finished = Queue.Queue()
+        self.ops = {'ping': lambda connection, request: {},
+                    'roll': self.roll,
+                    'system': self.system,
+                    'rolls': self.rolls,
+                    'odds': self.odds,
+                    'simulate': self.simulate}
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Connection(pair[0], self)
+
+    def handle(self, connection, line):
+        '''Answers one request line from {connection}.'''
+        try:
+            request = _native(json.loads(line))
+            if not isinstance(request, dict):
+                raise ValueError("Requests are JSON objects.")
+        except ValueError as e:
+            connection.reply({'id': None, 'ok': False, 'error': str(e)})
+            return
+        rid = request.get('id')
+        try:
+            op = self.ops[request.get('op')]
+        except (KeyError, TypeError):
+            connection.reply({'id': rid, 'ok': False,
+                             'error': "I don't know that op."})
+            return
+        try:
+            response = op(connection, request)
+        except KeyError as e:
+            connection.reply({'id': rid, 'ok': False,
+                             'error': "That op needs a %s."%e.args[0]})
+            return
+        except Exception as e:
+            #a malformed request mustn't cost the client its connection
+            connection.reply({'id': rid, 'ok': False, 'error': str(e)})
+            return
+        #heavy ops answer later, from the worker pool
+        if response is not None:
+            response.update(id=rid, ok=True)
+            connection.reply(response)
+
+    def offload(self, connection, request, func, *args):
+        '''Runs func(*args) on the worker pool, replying once it's done with
+        the dict it returns, or the string as the reply.'''
+        rid = request.get('id')
+        def done(result):
+            if not isinstance(result, dict):
+                result = {'reply': result}
+            result.update(id=rid, ok=True)
+            self.finished.put((connection, result))
+        def failed(e):
+            if isinstance(e, workers.TimedOut):
+                e = "That took too long, so I gave up on it."
+            self.finished.put((connection, {'id': rid, 'ok': False,
+                                            'error': str(e)}))
+        try:
+            self.workers.submit(func, args, done, failed,
+                                self.limits['workerTimeout'])
+        except workers.QueueFull:
+            raise ValueError("I'm busy, try again in a moment.")
+
+    def rng(self, request):
+        return rngs.get(request.get('channel'), self.backend, '')
+
+    ## Ops
+    def roll(self, connection, request):
+        total, terms, reply = core.rollExpression(
+            request['text'], self.rng(request), request.get('nick'))
+        return {'total': total, 'reply': reply}
+
+    def system(self, connection, request):
+        style = formatting.style(request.get('style', 'verbose'))
+        rolled = core.rollSystem(request['system'],
+                                 request.get('args', ()), self.rng(request),
+                                 request.get('nick'), request.get('note'),
+                                 style)
+        return {'reply': rolled.reply, 'action': rolled.action,
+                'score': rolled.system.score(rolled.result),
+                'verdict': rolled.system.verdict(rolled.result)}
+
+    def rolls(self, connection, request):
+        count = request['count']
+        if not 1 <= count <= self.limits['maxBulkRolls']:
+            raise ValueError("You can make between 1 and %s rolls at once."%
+                             self.limits['maxBulkRolls'])
+        text = request.get('text') or \
+               core.bulkText(request['system'], request.get('rest'))
+        self.offload(connection, request, _bulkRolls, text, count,
+                     self.rng(request))
+
+    def odds(self, connection, request):
+        self.offload(connection, request, core.oddsReport,
+                     request['system'], request['num'], request.get('opt'),
+                     request.get('kind'))
+
+    def simulate(self, connection, request):
+        trials = request['trials']
+        if not 1 <= trials <= self.limits['maxSimulationTrials']:
+            raise ValueError("You can simulate between 1 and %s rolls."%
+                             self.limits['maxSimulationTrials'])
+        system = request['system']
+        params = core.check(system, core.simulateArgs(system,
+            request['num'], request.get('opt'), request.get('kind')))
+        self.offload(connection, request, core.simulateReport, system,
+                     trials, params, self.limits['workerTimeout'])
+
+    def serve(self):
+        '''Runs until interrupted.'''
+        try:
+            while True:
+                asyncore.loop(POLL, count=1)
+                while True:
+                    try:
+                        connection, response = self.finished.get_nowait()
+                    except Queue.Empty:
+                        break
+                    if connection.connected:
+                        connection.reply(response)
+        finally:
+            self.workers.stop()
+            simulate.shutdown()
+            asyncore.close_all()
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-H', '--host', default='127.0.0.1',
+                      help='address to listen on (default %default)')
+    parser.add_option('-p', '--port', type='int', default=7455,
+                      help='port to listen on (default %default)')
+    parser.add_option('-t', '--threads', type='int', default=2,
+                      help='worker threads for bulk rolls, odds and '
+                           'simulations (default %default)')
+    parser.add_option('-b', '--backend', default='random',
+                      choices=sorted(rngs.BACKENDS),
+                      help='random number generator (default %default)')
+    options, args = parser.parse_args(argv)
+    server = Server(options.host, options.port, options.threads,
+                    options.backend)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
@@ -0,0 +1,189 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Monte Carlo simulation of RPGDice rolls.
+
+Trials are split into chunks and farmed out to a pool of worker processes.
+Every chunk gets its own random.Random seeded from one master stream, so
+workers never share RNG state and a run can be repeated from its seed."""
+
+import os
+import time
+import random
+import threading
+import multiprocessing
+
+import systems
+
+#chunks handed out per worker, so a slow worker doesn't hold up the rest.
+CHUNKS_PER_WORKER = 4
+
+#every run gets its own process pool, so one that times out can stop its
+#workers without stalling anyone else's; the bot starts runs from several
+#threads, so the set of pools still up is under _lock
+_lock = threading.Lock()
+_pools = set()
+
+def _owod(rng, trials, params):
+    '''Rolls {trials} oWoD pools and tallies successes and botches.'''
+    owod = systems.get('owod')
+    tally = {'successes': [0] * (params[0]+1), 'botches': 0}
+    successes = tally['successes']
+    for _ in xrange(trials):
+        result = owod.evaluate(params, owod.roll(params, rng))
+        successes[result.successes] += 1
+        if result.botch:
+            tally['botches'] += 1
+    return tally
+
+def _ore(rng, trials, params):
+    '''Rolls {trials} ORE pools and tallies the widest set's width and
+    height.'''
+    ore = systems.get('ore')
+    pool, called, expert, wiggle = params
+    size = pool + bool(called) + bool(expert) + (wiggle or 0)
+    tally = {'matches': 0, 'width': [0] * (size+1), 'height': [0] * 11}
+    for _ in xrange(trials):
+        counts = ore.roll(params, rng)
+        if wiggle:
+            counts = ore.best(counts, wiggle)[1]
+        width, height = ore.widest(counts)
+        tally['width'][width] += 1
+        tally['height'][height] += 1
+        if width:
+            tally['matches'] += 1
+    return tally
+
+def _dh(rng, trials, params):
+    '''Rolls {trials} Dark Heresy tests and tallies outcomes, degrees of
+    success and where each successful hit landed.'''
+    dh = systems.get('dh')
+    tally = {'success': 0, 'failure': 0, 'critical': 0, 'jam': 0,
+             'degrees': {}, 'locations': {}}
+    degrees = tally['degrees']
+    locations = tally['locations']
+    for _ in xrange(trials):
+        roll = dh.roll(params, rng)
+        result = dh.evaluate(params, roll)
+        tally[result.outcome] += 1
+        if result.outcome == "success":
+            degrees[result.degrees] = degrees.get(result.degrees, 0) + 1
+            hit = dh.location(roll)
+            locations[hit] = locations.get(hit, 0) + 1
+    return tally
+
+_systems = {'owod': _owod, 'ore': _ore, 'dh': _dh}
+
+def _chunk(job):
+    '''Runs one chunk of trials in a worker process.'''
+    system, seed, trials, params = job
+    return _systems[system](random.Random(seed), trials, params)
+
+def _merge(total, tally):
+    '''Adds the tally of one chunk into {total}.'''
+    for key, value in tally.iteritems():
+        if key not in total:
+            total[key] = value
+        elif isinstance(value, list):
+            total[key] = [a+b for a, b in zip(total[key], value)]
+        elif isinstance(value, dict):
+            for k, v in value.iteritems():
+                total[key][k] = total[key].get(k, 0) + v
+        else:
+            total[key] += value
+    return total
+
+def _start(workers):
+    '''Starts a pool of {workers} processes for one run.'''
+    pool = multiprocessing.Pool(workers)
+    with _lock:
+        _pools.add(pool)
+    return pool
+
+def _stop(pool):
+    '''Stops {pool}, unless shutdown() got there first.'''
+    with _lock:
+        if pool not in _pools:
+            return
+        _pools.discard(pool)
+    pool.terminate()
+    pool.join()
+
+def shutdown():
+    '''Stops every worker pool, cutting short any runs still using one.'''
+    with _lock:
+        pools = list(_pools)
+        _pools.clear()
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+def run(system, trials, params, workers=None, seed=None, timeout=None):
+    '''Simulates {trials} rolls of {system} ("owod", "ore" or "dh") and
+    returns the tallies, plus the trial count and the seed used.
+
+    {params} are the system's roll parameters, as returned by its check().
+    If the run takes more than {timeout} seconds, its workers are stopped
+    and multiprocessing.TimeoutError raised.'''
+    if system not in _systems:
+        raise ValueError("I can't simulate %s."%system)
+    if trials < 1:
+        raise ValueError("You must simulate at least one roll.")
+    if seed is None:
+        seed = int(os.urandom(16).encode('hex'), 16)
+    master = random.Random(seed)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = _start(workers)
+    try:
+        chunks = min(trials, workers * CHUNKS_PER_WORKER)
+        size, extra = divmod(trials, chunks)
+        jobs = [(system, master.getrandbits(128), size + (x < extra),
+                 tuple(params)) for x in xrange(chunks)]
+        total = {}
+        results = pool.imap_unordered(_chunk, jobs)
+        deadline = timeout and time.time() + timeout
+        for _ in jobs:
+            if deadline:
+                tally = results.next(max(deadline - time.time(), 0))
+            else:
+                tally = results.next()
+            _merge(total, tally)
+    finally:
+        #on a timeout the workers are still chewing on our chunks
+        _stop(pool)
+    total['trials'] = trials
+    total['seed'] = seed
+    return total
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
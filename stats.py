@@ -0,0 +1,160 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""Timing for RPGDice's own share of each command.
+
+A command asks for a timer, calls lap() after each stage (parse, roll,
+evaluate, format, reply) and done() at the end. Each stage's time goes
+into a count, a total, a max and a histogram of power-of-two microsecond
+buckets. When stats are off, timer() hands back a shared do-nothing timer,
+so the cost of leaving the calls in place is one attribute lookup a
+stage."""
+
+import threading
+from timeit import default_timer
+
+#the stages we expect, in order; others are kept too, after these
+STAGES = ('parse', 'roll', 'evaluate', 'format', 'reply')
+#bucket {n} counts times under 2**n microseconds (the last, everything else)
+BUCKETS = 24
+
+_lock = threading.Lock()
+#{command: [calls, {stage: [count, total, max, buckets]}]}
+_commands = {}
+
+def _bucket(seconds):
+    '''Returns the histogram bucket for {seconds}.'''
+    micro = int(seconds * 1e6)
+    return min(micro.bit_length(), BUCKETS-1)
+
+def record(command, stage, seconds):
+    '''Adds {seconds} spent in {stage} of {command}.'''
+    _lock.acquire()
+    try:
+        stages = _commands.setdefault(command, [0, {}])[1]
+        try:
+            entry = stages[stage]
+        except KeyError:
+            entry = stages[stage] = [0, 0.0, 0.0, [0] * BUCKETS]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+        entry[3][_bucket(seconds)] += 1
+    finally:
+        _lock.release()
+
+def _called(command):
+    _lock.acquire()
+    try:
+        _commands.setdefault(command, [0, {}])[0] += 1
+    finally:
+        _lock.release()
+
+class Timer(object):
+    """Times the stages of one run of a command."""
+    def __init__(self, command):
+        self.command = command
+        self.last = default_timer()
+
+    def lap(self, stage):
+        '''Records the time since the last lap as {stage}.'''
+        now = default_timer()
+        record(self.command, stage, now - self.last)
+        self.last = now
+
+    def done(self):
+        '''Counts the command as run.'''
+        _called(self.command)
+
+class _NullTimer(object):
+    """Stands in for a Timer when stats are off."""
+    def lap(self, stage):
+        pass
+
+    def done(self):
+        pass
+
+_null = _NullTimer()
+
+def timer(command, enabled=True):
+    '''Returns a Timer for {command}, or a do-nothing one if not {enabled}.'''
+    if enabled:
+        return Timer(command)
+    return _null
+
+def _percentile(buckets, fraction):
+    '''Returns the upper bound, in microseconds, of the bucket holding the
+    {fraction} percentile.'''
+    target = sum(buckets) * fraction
+    seen = 0
+    for n, count in enumerate(buckets):
+        seen += count
+        if count and seen >= target:
+            return 2 ** n
+    return 0
+
+def snapshot():
+    '''Returns every command's stats as plain data, ready for json.'''
+    _lock.acquire()
+    try:
+        ret = {}
+        for command, (calls, stages) in _commands.iteritems():
+            ret[command] = {'calls': calls, 'stages': {}}
+            for stage, (count, total, most, buckets) in stages.iteritems():
+                ret[command]['stages'][stage] = {
+                    'count': count,
+                    'totalUs': round(total * 1e6, 1),
+                    'meanUs': round(total * 1e6 / count, 2),
+                    'maxUs': round(most * 1e6, 1),
+                    'p50Us': _percentile(buckets, 0.5),
+                    'p99Us': _percentile(buckets, 0.99),
+                    'buckets': list(buckets)}
+        return ret
+    finally:
+        _lock.release()
+
+def ordered(stages):
+    '''Returns the names in {stages} in pipeline order.'''
+    known = [stage for stage in STAGES if stage in stages]
+    return known + sorted(set(stages) - set(STAGES))
+
+def reset():
+    '''Forgets everything recorded so far.'''
+    _lock.acquire()
+    try:
+        _commands.clear()
+    finally:
+        _lock.release()
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
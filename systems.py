@@ -0,0 +1,106 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""The registry of game systems RPGDice can roll for.
+
+Each system is a module of its own, imported the first time it's asked
+for, so a system nobody uses never costs the bot anything at startup or
+reload. A system module provides:
+
+    NAME                        the name it's rolled by
+    WORDS                       (optional) words, rather than numbers, its
+                                expression form takes as arguments
+    check(*args)                validates arguments, returning params
+                                (raises ValueError)
+    roll(params, rng=None)      rolls the dice
+    evaluate(params, raw)       scores what was rolled
+    score(result)               the number it adds to a dice expression
+    verdict(result)             what the roll did, e.g. "succeeded", for
+                                tallies of rolls
+    logEntry(params, raw, result)
+                                (args, outcome, success, dice) for the
+                                roll log
+    describe(params, raw, result)
+                                how it reads as a term of an expression
+    format(params, raw, result, nick=None, note=None, style=None)
+                                its command's (reply, action), worded
+                                in a formatting.Style"""
+
+import sys
+
+#{system name: module name}
+_registry = {'owod': 'owod',
+             'ore': 'ore',
+             'dh': 'darkheresy'}
+#{system name: module}, filled in as systems are first used
+_loaded = {}
+#the package we live in, if any, so system modules are found beside us
+package = __name__.rpartition('.')[0]
+
+def register(name, module):
+    '''Adds (or replaces) the system {name}, found in the module {module}
+    next to this one.'''
+    _registry[name] = module
+    _loaded.pop(name, None)
+
+def names():
+    '''Returns the names of every registered system.'''
+    return sorted(_registry)
+
+def isSystem(name):
+    '''Checks to see if {name} is a registered system.'''
+    return name in _registry
+
+def get(name):
+    '''Returns the module for the system {name}, importing it if this is
+    the first time it's been asked for.'''
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+    try:
+        module = _registry[name]
+    except KeyError:
+        raise ValueError("I don't know the %s system."%name)
+    if package:
+        module = '%s.%s'%(package, module)
+    if module in sys.modules:
+        #left over from before the plugin was reloaded; pick up any changes
+        system = reload(sys.modules[module])
+    else:
+        __import__(module)
+        system = sys.modules[module]
+    _loaded[name] = system
+    return system
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
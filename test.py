@@ -28,10 +28,253 @@
 
 ###
 
+import json
+
 from supybot.test import *
 
 class ORETestCase(PluginTestCase):
     plugins = ('RPGDice',)
 
+    def setUp(self):
+        PluginTestCase.setUp(self)
+        #the tests roll far faster than any player
+        conf.supybot.plugins.RPGDice.nickRollsPerMinute.setValue(0)
+
+    def tearDown(self):
+        limit = conf.supybot.plugins.RPGDice.nickRollsPerMinute
+        limit.setValue(limit.default)
+        PluginTestCase.tearDown(self)
+
+    def testOre(self):
+        self.assertError('ore 11')
+        self.assertError('ore 3 11')
+        self.assertError('ore 3 4 11')
+        self.assertRegexp('ore 1 5 5', r'2x5')
+        self.assertRegexp('ore 1 0 0 2', r'3x\d+.*wiggle:')
+        self.assertError('ore 3 0 0 5')
+
+    def testWiggle(self):
+        self.assertResponse('wiggle 2 1 4 5 5 7', 'set them to 5, 5: 4x5 (loose 1, 4, 7)')
+        self.assertRegexp('wiggle 2 1 4 5 5 7 high', r'set them to 10, 10: 2x5, 2x10')
+        self.assertError('wiggle 9 1 2')
+        self.assertError('wiggle 1 11')
+
+    def testOwod(self):
+        self.assertError('owod 21')
+        self.assertRegexp('owod 5 2 pick the lock', r'rolls .* to pick the lock')
+
+    def testDh(self):
+        self.assertError('dh 301')
+        self.assertRegexp('dh 300 auto', r'(successful hit|jams).*\[\d+\]')
+        self.assertNotRegexp('dh 1', r'ful hit')
+
+    def testRoll(self):
+        self.assertRegexp('roll 2d6kh1+3', r'\[\d+\] \(dropped \d+\) \+ 3 = \d+')
+        self.assertRegexp('roll owod(5,6)', r'owod\(5,6\) \[')
+        self.assertRegexp('roll ore(5,,3)', r'ore\(5,0,3\) \[')
+        self.assertError('roll owod(5 6)')
+        self.assertError('roll 2d6kh3')
+        self.assertError('roll 5d1')
+        self.assertRegexp('roll 3d6rr5', r'\[[\d, ]+\] = \d+')
+        self.assertError('roll 3d6rr6')
+
+    def testOneSidedDice(self):
+        import dice
+        self.assertEqual(dice.rollFaces(1, 3), [1, 1, 1])
+        self.assertEqual(list(dice.rollCounts(1, 5)), [5])
+
+    def testExplodingCaps(self):
+        import dice
+        self.assertNotError('roll 100d2!2')
+        #every die explodes, so only the caps stop them
+        self.assertEqual(len(dice.explode(2, [2]*2000, 2)), dice.MAX_EXTRA)
+        self.assertEqual(len(dice.explode(2, [1], 1)), dice.MAX_WAVES)
+
+    def testRolls(self):
+        self.assertRegexp('rolls 5 owod 8 6', r'^5 rolls of owod\(8,6\): average')
+        self.assertRegexp('rolls 5 owod 8 1', r'\(5 succeeded\)$')
+        self.assertRegexp('rolls 3 2d6+1', r'lowest \d+, highest \d+')
+        self.assertError('rolls 1000 owod 8 6')
+        self.assertError('rolls 5 ore 11')
+
+    def testBulkLines(self):
+        lines = conf.supybot.plugins.RPGDice.maxBulkLines
+        try:
+            lines.setValue(2)
+            self.assertRegexp('rolls 20 100d100',
+                              r'^20 rolls .*cut short after 2 lines$')
+            self.assertNotRegexp('rolls 2 2d6', 'cut short')
+        finally:
+            lines.setValue(lines.default)
+
+    def testSeededRolls(self):
+        backend = conf.supybot.plugins.RPGDice.rngBackend
+        seed = conf.supybot.plugins.RPGDice.rngSeed
+        try:
+            backend.setValue('pcg')
+            seed.setValue('dispute')
+            first = self.getMsg('roll 10d10').args[1]
+            seed.setValue('other')
+            self.assertNotError('roll 10d10')
+            seed.setValue('dispute')
+            self.assertResponse('roll 10d10', first)
+        finally:
+            backend.setValue(backend.default)
+            seed.setValue(seed.default)
+
+    def testReplyStyle(self):
+        style = conf.supybot.plugins.RPGDice.replyStyle
+        try:
+            style.setValue('compact')
+            self.assertRegexp('owod 5 1', r'^success x5 \(difficulty 1\)')
+            self.assertRegexp('owod 3 6', r'^[\d ]+: ')
+        finally:
+            style.setValue(style.default)
+        self.assertRegexp('owod 5 1', r'succeed 5 times')
+
+    def testRateLimit(self):
+        limit = conf.supybot.plugins.RPGDice.nickRollsPerMinute
+        burst = conf.supybot.plugins.RPGDice.nickRollBurst
+        try:
+            limit.setValue(1)
+            burst.setValue(2)
+            self.assertNotError('owod 5 6')
+            self.assertNotError('roll 2d6')
+            self.assertRegexp('owod 5 6', r'too fast')
+            #once told, further rolls are dropped without a reply
+            self.assertNoResponse('owod 5 6', 1)
+        finally:
+            burst.setValue(burst.default)
+
+    def testMacros(self):
+        self.assertError('save sword dh 301')
+        self.assertNotError('save sword dh 45 semi')
+        self.assertNotError('save dodge owod 6 7 to duck')
+        self.assertRegexp('macros', r'dodge \(owod 6 7\), sword \(dh 45 semi\)')
+        self.assertRegexp('r dodge', r'rolls .* to duck')
+        self.assertRegexp('r sword', r'\[\d+\]')
+        self.assertNotError('unsave sword')
+        self.assertError('r sword')
+
+    def testRollLog(self):
+        #difficulties too big for the log's fields still log
+        self.assertNotError('owod 5 40000')
+        self.assertNotError('owod 5 -40000')
+        self.assertNotError('owod 5 6')
+        self.assertRegexp('rollstats', r'\d+ rolls, .* successful \(owod')
+        self.assertRegexp('rollstats %s'%self.nick.upper(),
+                          r'\d+ rolls, .* successful \(owod')
+        self.assertRegexp('rollstats nobody', r"haven't logged")
+
+    def testDicestats(self):
+        enabled = conf.supybot.plugins.RPGDice.stats
+        try:
+            enabled.setValue(True)
+            self.assertNotError('dicestats reset')
+            self.assertNotError('owod 5 6')
+            self.assertRegexp('dicestats', r'owod: 1 calls \(parse')
+        finally:
+            enabled.setValue(enabled.default)
+
+    def testOdds(self):
+        self.assertRegexp('odds owod 7 6', r'success 99\.22%.*botch 0\.62%')
+        self.assertRegexp('odds ore 1', r'match 0\.00%')
+        self.assertRegexp('odds dh 45 semi', r'success 45\.00%.*jam 5\.00%')
+        self.assertError('odds owod 21')
+        self.assertError('odds ore 5 3')
+
+    def testRerollOdds(self):
+        import odds
+        from fractions import Fraction
+        self.assertEqual(sum(odds.rerolled(6, 2)), 1)
+        self.assertEqual(sum(odds.rerolled(6, 2, until=True)), 1)
+        self.assertEqual(sum(odds.exploding(6, 6).values()), 1)
+        die = odds.exploding(6, 6, waves=2)
+        self.assertEqual(sum(odds.pool(3, die).values()), 1)
+        once = odds.exploding(6, 6, waves=1)
+        #a d6 plus, one time in six, another d6
+        self.assertEqual(sum(total*p for total, p in once.iteritems()),
+                         Fraction(7, 2) + Fraction(7, 12))
+
+    def testSimulate(self):
+        self.assertError('simulate owod 0 7')
+        self.assertError('simulate ore 100 11')
+        self.assertError('simulate dh 100 45 3')
+
+    def testSimulateRun(self):
+        import simulate
+        try:
+            tally = simulate.run('owod', 100, (3, 6), workers=1, seed='test')
+            self.assertEqual(sorted(tally),
+                             ['botches', 'seed', 'successes', 'trials'])
+            self.assertEqual(len(tally['successes']), 4)
+            self.assertEqual(sum(tally['successes']), 100)
+            self.assertEqual(tally['trials'], 100)
+            self.assertTrue(0 <= tally['botches'] <= tally['successes'][0])
+            self.assertEqual(simulate.run('owod', 100, (3, 6), workers=1,
+                                          seed='test'), tally)
+            import multiprocessing
+            self.assertRaises(multiprocessing.TimeoutError, simulate.run,
+                              'owod', 10**7, (3, 6), workers=1, timeout=0.1)
+            #the run that gave up stopped its own workers, and only those
+            self.assertEqual(simulate.run('owod', 100, (3, 6), workers=1,
+                                          seed='test'), tally)
+        finally:
+            simulate.shutdown()
+
+class _FakeConnection(object):
+    """Stands in for a server Connection, keeping what it's sent."""
+    connected = True
+
+    def __init__(self):
+        self.replies = []
+
+    def reply(self, response):
+        self.replies.append(response)
+
+class ServerTestCase(SupyTestCase):
+    def setUp(self):
+        SupyTestCase.setUp(self)
+        import server
+        self.server = server.Server('127.0.0.1', 0, threads=1)
+        self.connection = _FakeConnection()
+
+    def tearDown(self):
+        self.server.workers.stop()
+        self.server.close()
+        SupyTestCase.tearDown(self)
+
+    def send(self, request):
+        self.server.handle(self.connection, json.dumps(request))
+        return self.connection.replies[-1]
+
+    def finish(self):
+        '''Waits for the next reply from the worker pool.'''
+        connection, response = self.server.finished.get(timeout=10)
+        self.assertTrue(connection is self.connection)
+        return response
+
+    def testBadRequests(self):
+        response = self.send({'id': 1, 'op': 'roll', 'text': 5})
+        self.assertEqual((response['id'], response['ok']), (1, False))
+        response = self.send({'id': 2, 'op': 'juggle'})
+        self.assertEqual(response['error'], "I don't know that op.")
+        response = self.send({'id': 3, 'op': 'roll'})
+        self.assertEqual(response['error'], "That op needs a text.")
+        self.server.handle(self.connection, 'not json')
+        self.assertEqual(self.connection.replies[-1]['ok'], False)
+
+    def testPipelined(self):
+        self.send({'id': 'a', 'op': 'roll', 'text': 'owod(5,6'})
+        self.send({'id': 'b', 'op': 'rolls', 'count': 3, 'text': '2d6'})
+        self.send({'id': 'c', 'op': 'roll', 'text': '2d6+1'})
+        self.send({'id': 'd', 'op': 'ping'})
+        #bulk rolls answer later, from the worker pool
+        self.assertEqual([(r['id'], r['ok']) for r in self.connection.replies],
+                         [('a', False), ('c', True), ('d', True)])
+        response = self.finish()
+        self.assertEqual((response['id'], response['ok']), ('b', True))
+        self.assertTrue(response['summary'].startswith('3 rolls of 2d6'))
+
 
 # vim:set shiftwidth=4 tabstop=4 expandtab textwidth=79:
@@ -0,0 +1,161 @@
+###
+# coding=UTF-8
+# Copyright (c) 2013, Ashley Davis (ashley@airsi.de)
+# http://kittyanarchy.net/ http://airsi.de/
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions, and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions, and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name of the author of this software nor the name of
+#     contributors to this software may be used to endorse or promote products
+#     derived from this software without specific prior written consent.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+###
+
+"""A small, bounded pool of worker threads for RPGDice's heavy commands.
+
+Supybot runs commands on its main thread, so anything slow (simulations,
+odds tables, bulk rolls) is handed to a WorkerPool instead. The queue has a
+fixed size so one busy user can't pile up work for everyone else, and every
+job has a deadline after which its caller is told it timed out."""
+
+import Queue
+import threading
+
+class QueueFull(Exception):
+    """Raised when a job is submitted to a pool whose queue is full."""
+    pass
+
+class TimedOut(Exception):
+    """Passed to a job's failure callback when its deadline passes."""
+    pass
+
+class _Job(object):
+    '''One unit of work. Exactly one of its callbacks is ever called.'''
+    def __init__(self, func, args, done, failed):
+        self.func = func
+        self.args = args
+        self.done = done
+        self.failed = failed
+        self.timer = None
+        self._lock = threading.Lock()
+        self._settled = False
+
+    def settle(self):
+        '''Claims the right to report on this job. Returns False if it's
+        already been reported on, by the worker or by the timer.'''
+        self._lock.acquire()
+        try:
+            if self._settled:
+                return False
+            self._settled = True
+            if self.timer is not None:
+                self.timer.cancel()
+            return True
+        finally:
+            self._lock.release()
+
+    def expire(self):
+        '''Called by the timer when the job's deadline passes.'''
+        if self.settle() and self.failed is not None:
+            self.failed(TimedOut())
+
+    def run(self):
+        '''Runs the job, unless it already timed out in the queue.'''
+        if self._settled:
+            return
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            if self.settle() and self.failed is not None:
+                self.failed(e)
+        else:
+            if self.settle() and self.done is not None:
+                self.done(result)
+
+class WorkerPool(object):
+    """Runs jobs on up to {threads} threads, holding at most {queueSize}
+    waiting jobs. Threads are started on the first submit."""
+    def __init__(self, threads, queueSize, name='RPGDice worker'):
+        self.threads = threads
+        self.name = name
+        self.jobs = Queue.Queue(queueSize)
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        '''Starts the worker threads if they aren't running yet.'''
+        self._lock.acquire()
+        try:
+            while len(self._workers) < self.threads:
+                worker = threading.Thread(target=self._work, name='%s %s'%
+                                          (self.name, len(self._workers)))
+                worker.setDaemon(True)
+                worker.start()
+                self._workers.append(worker)
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        '''Worker thread main loop; a None job means stop.'''
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            job.run()
+
+    def submit(self, func, args=(), done=None, failed=None, timeout=None):
+        '''Queues func(*args). done(result) is called with its result, or
+        failed(exception) if it raises or takes longer than {timeout}
+        seconds, counted from now. Raises QueueFull if the queue is.'''
+        self._start()
+        job = _Job(func, args, done, failed)
+        if timeout:
+            job.timer = threading.Timer(timeout, job.expire)
+            job.timer.setDaemon(True)
+        try:
+            self.jobs.put_nowait(job)
+        except Queue.Full:
+            raise QueueFull()
+        if job.timer is not None:
+            job.timer.start()
+        return job
+
+    def stop(self):
+        '''Tells every worker to finish its current job and exit. Jobs still
+        in the queue are dropped.'''
+        self._lock.acquire()
+        try:
+            while True:
+                try:
+                    job = self.jobs.get_nowait()
+                except Queue.Empty:
+                    break
+                if job is not None:
+                    job.settle()
+            for worker in self._workers:
+                self.jobs.put(None)
+            self._workers = []
+        finally:
+            self._lock.release()
+
+
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79: